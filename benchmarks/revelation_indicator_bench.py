@@ -0,0 +1,359 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Benchmarks for unlocking, reloading and browsing synthetic databases.
+
+Runs the indicator against generated Revelation files of several sizes
+and prints the timings as JSON, e.g.:
+
+    $ python benchmarks/revelation_indicator_bench.py --sizes 100,1000 \\
+        --output bench.json
+
+Without a display the benchmark restarts itself under xvfb-run.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+PASSWORD = 'benchmark'
+
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+
+## loads a file in a fresh process and prints its peak resident memory
+PEAK_MEMORY_SCRIPT = """
+import sys
+from revelation_indicator import loader, memory
+loader.load_file(sys.argv[1], sys.argv[2], stream=sys.argv[3] == 'stream')
+sys.stdout.write('%d\\n' % memory.peak_resident_memory())
+"""
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+
+    if len(values) % 2:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def generate_entrystore(size, depth, fanout=10):
+    """
+    Creates an entrystore with size entries, spread evenly over a tree
+    of folders that is depth levels deep.
+    """
+    from revelation import data, entry
+
+    entrystore = data.EntryStore()
+
+    folders = [None]
+    for level in range(depth):
+        parents, folders = folders, []
+
+        for parent in parents:
+            for i in range(fanout):
+                folder = entry.FolderEntry()
+                folder.name = 'Folder %d.%d' % (level, i)
+                folders.append(entrystore.add_entry(folder, parent))
+
+    for i in range(size):
+        e = entry.WebEntry()
+        e.name = 'Account %d' % i
+        e.description = 'Synthetic account number %d' % i
+        e[entry.HostnameField] = 'https://host%d.example.com/' % i
+        e[entry.UsernameField] = 'user%d' % i
+        e[entry.PasswordField] = 'secret%d' % i
+        entrystore.add_entry(e, folders[i % len(folders)])
+
+    return entrystore
+
+
+def generate_file(directory, size, depth):
+    "Writes a synthetic database file and returns its name"
+    from revelation import datahandler
+
+    filename = os.path.join(directory, 'bench-%d-%d.rvl' % (size, depth))
+
+    output = open(filename, 'wb')
+    try:
+        output.write(datahandler.Revelation().export_data(
+            generate_entrystore(size, depth), PASSWORD
+        ))
+    finally:
+        output.close()
+
+    return filename
+
+
+def pump(condition, timeout=600):
+    "Runs the GTK main loop until condition() is true"
+    import gtk
+
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise RuntimeError('benchmark step timed out')
+
+        gtk.main_iteration(block=False)
+
+
+def measure(func, repeat, setup=None):
+    """
+    Returns the wall clock time of repeat calls of func, setup is called
+    before each of them without being timed
+    """
+    times = []
+
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+
+        started = time.time()
+        func()
+        times.append(time.time() - started)
+
+    return times
+
+
+def bench_file(indicator, filename, repeat):
+    "Runs all benchmarks against an open file, returns results by name"
+    from revelation_indicator import loader
+
+    results = {}
+    database = indicator.databases[0]
+
+    def file_load():
+        database.file_close()
+        database.file_open(filename, PASSWORD)
+        pump(lambda: database.database_item.get_submenu() is not None)
+
+    results['file_load'] = measure(file_load, repeat)
+    results['load_file_worker'] = measure(
+        lambda: loader.load_file(filename, PASSWORD), repeat
+    )
+    results['load_file_stream_worker'] = measure(
+        lambda: loader.load_file(filename, PASSWORD, stream=True), repeat
+    )
+
+    ## the submenus of the open file, which every repeat starts from
+    database._Database__finish_menus()
+    entrymenus = dict(database.entrymenus)
+    generated = []
+
+    def generate_reset():
+        ## drop the menus of the previous repeat, so each one generates
+        ## the whole menu instead of adding to the state left behind
+        for menu in generated:
+            menu.destroy()
+
+        del generated[:]
+        database.entrymenus.clear()
+        database.entrymenus.update(entrymenus)
+
+    def generate(lazy):
+        ## all items, not only the first chunk the builders add right away
+        generated.append(
+            database._Database__generate_entrymenu(database.entrystore, lazy=lazy)
+        )
+        database._Database__finish_menus()
+
+    results['generate_entrymenu_lazy'] = measure(
+        lambda: generate(True), repeat, generate_reset
+    )
+    results['generate_entrymenu_full'] = measure(
+        lambda: generate(False), repeat, generate_reset
+    )
+    generate_reset()
+
+    reloader = database.reloader
+
+    def content_changed():
+        ## forget the last load, so the reload is not skipped as unchanged
+        reloader.cancel()
+        database._Database__cb_file_content_changed(None)
+        pump(lambda: reloader.timeout is None and not reloader.running)
+
+    ## the configured delay before reloading would be timed as well
+    config_get = indicator.config.get
+    indicator.config.get = lambda key: 0 if key == 'reload_delay' else config_get(key)
+
+    try:
+        results['file_content_changed'] = measure(content_changed, repeat)
+
+    finally:
+        del indicator.config.get
+
+    path = first_entry_path(database.entrystore)
+
+    def entry_show():
+        indicator.popup_latency = None
+        database.get_entry(path, indicator.entry_show)
+        pump(lambda: indicator.popup_latency is not None)
+
+    results['entry_show'] = measure(entry_show, repeat)
+
+    return results
+
+
+def bench_memory(filename):
+    """
+    Returns the peak resident memory in bytes of loading a file whole and
+    streamed, each in a process of its own
+    """
+    results = {}
+
+    for name, mode in (('load_file', 'whole'), ('load_file_stream', 'stream')):
+        results[name] = int(subprocess.check_output([
+            sys.executable, '-c', PEAK_MEMORY_SCRIPT, filename, PASSWORD, mode
+        ]))
+
+    return results
+
+
+def first_entry_path(entrystore, parent=None):
+    "Returns the path of the first entry that is not a folder"
+    from revelation import entry
+
+    for i in range(entrystore.iter_n_children(parent)):
+        iter = entrystore.iter_nth_child(parent, i)
+
+        if entrystore.get_entry(iter).id != entry.FolderEntry.id:
+            return entrystore.get_path(iter)
+
+        path = first_entry_path(entrystore, iter)
+        if path is not None:
+            return path
+
+    return None
+
+
+def bench_config(indicator, calls=10000):
+    "Returns the average time of a cached and an uncached Config.get"
+    config = indicator.config
+
+    started = time.time()
+    for i in range(calls):
+        config.get('autolock_timeout')
+    cached = (time.time() - started) / calls
+
+    started = time.time()
+    for i in range(calls // 100):
+        config.clear_cache()
+        config.get('autolock_timeout')
+    uncached = (time.time() - started) / (calls // 100)
+
+    return {'config_get_cached': [cached], 'config_get_uncached': [uncached]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument(
+        '--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+        help='comma separated numbers of entries to benchmark'
+    )
+    parser.add_argument(
+        '--depth', type=int, default=2,
+        help='folder depth of the generated databases'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='how often to repeat each measurement'
+    )
+    parser.add_argument(
+        '--output', default='-',
+        help='file to write the JSON results to, - for stdout'
+    )
+    options = parser.parse_args()
+
+    if not os.environ.get('DISPLAY') and not os.environ.get('BENCH_XVFB'):
+        os.environ['BENCH_XVFB'] = '1'
+
+        try:
+            os.execvp('xvfb-run', ['xvfb-run', '-a', sys.executable] + sys.argv)
+
+        except OSError as error:
+            sys.exit('no display and unable to run xvfb-run: %s' % error.strerror)
+
+    from revelation_indicator import RevelationIndicator, __version__
+
+    indicator = RevelationIndicator()
+    sys.excepthook = sys.__excepthook__
+
+    database = indicator.databases[0]
+    pump(lambda: database.unlock_item.get_property('sensitive'))
+
+    ## the benchmark must not lock the file halfway through
+    database.activity.start = lambda timeout: None
+
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'depth': options.depth,
+        'repeat': options.repeat,
+        'results': [],
+        'memory': [],
+    }
+
+    directory = tempfile.mkdtemp(prefix='revelation-indicator-bench-')
+    try:
+        for size in [int(size) for size in options.sizes.split(',')]:
+            filename = generate_file(directory, size, options.depth)
+
+            results = bench_file(indicator, filename, options.repeat)
+            results.update(bench_config(indicator))
+
+            for name, times in sorted(results.items()):
+                report['results'].append({
+                    'size': size,
+                    'operation': name,
+                    'times': times,
+                    'min': min(times),
+                    'median': median(times),
+                    'max': max(times),
+                })
+
+            for name, peak in sorted(bench_memory(filename).items()):
+                report['memory'].append({
+                    'size': size,
+                    'operation': name,
+                    'peak_resident_memory': peak,
+                })
+
+            database.file_close()
+
+    finally:
+        shutil.rmtree(directory)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+
+    if options.output == '-':
+        sys.stdout.write(output + '\n')
+    else:
+        open(options.output, 'w').write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
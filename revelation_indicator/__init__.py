@@ -19,7 +19,11 @@ __version__ = "0.1.5"
 
 import os
 import sys
+import time
 import gconf
+import signal
+import socket
+import gobject
 
 import logging
 logger = logging.getLogger(__file__)
@@ -30,30 +34,108 @@ import appindicator
 import gettext
 _ = gettext.gettext
 
-from revelation import config, data, datahandler, dialog, entry, io, ui, util
+from revelation import config
+
+from revelation_indicator import instrument, profiler, secret, skeleton
+from revelation_indicator.clipboard import ClipboardChain
+from revelation_indicator.database import Database
+from revelation_indicator.launcher import LauncherCache
+from revelation_indicator.service import Service
+from revelation_indicator.lazy import LazyModule
+
+## not needed to show the indicator, imported on first use
+data = LazyModule('revelation.data')
+dialog = LazyModule('revelation.dialog')
+entry = LazyModule('revelation.entry')
+io = LazyModule('revelation.io')
+util = LazyModule('revelation.util')
+dialogs = LazyModule('revelation_indicator.dialogs')
 
 
 class Config(config.Config):
+    """
+    Configuration with an in-process value cache. Each key is read from
+    gconf once, later changes are picked up through gconf notifications
+    which drop the cached value.
+    """
 
     def __init__(self, basedir):
         super(Config, self).__init__(basedir)
 
+        self.cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.__watched = set()
+        self.__watched_dirs = set([self.basedir])
+
+    def __cb_notify(self, client, id, entry, data):
+        "Drops the cached value of a changed key before notifying"
+        self.cache.pop(entry.get_key(), None)
+
+        callback, userdata = data
+
+        if callback is not None:
+            super(Config, self).__cb_notify(client, id, entry, data)
+
+    def __watch(self, keypath):
+        "Makes sure the cached value of keypath is dropped when it changes"
+
+        if keypath in self.__watched:
+            return
+
+        dirpath = os.path.dirname(keypath)
+
+        if not dirpath.startswith(self.basedir) and dirpath not in self.__watched_dirs:
+            self.client.add_dir(dirpath, gconf.CLIENT_PRELOAD_NONE)
+            self.__watched_dirs.add(dirpath)
+
+        self.client.notify_add(keypath, self.__cb_notify, (None, None))
+        self.__watched.add(keypath)
+
+    def clear_cache(self):
+        "Drops all cached values"
+        self.cache.clear()
+
     def get(self, key):
-        value = self.client.get(self.__resolve_keypath(key))
+        keypath = self.__resolve_keypath(key)
+
+        if keypath in self.cache:
+            self.cache_hits += 1
+            instrument.count('config_get.hit')
+            return self.cache[keypath]
+
+        self.cache_misses += 1
+        instrument.count('config_get.miss')
+
+        with instrument.span('config_get.miss'):
+            value = self.__get_uncached(keypath)
+
+        self.__watch(keypath)
+        self.cache[keypath] = value
+
+        return value
+
+    def set(self, key, value):
+        self.cache.pop(self.__resolve_keypath(key), None)
+        super(Config, self).set(key, value)
+
+    def __get_uncached(self, keypath):
+        value = self.client.get(keypath)
 
         if value is None:
 
             schema_value = self.client.get(
-                self.__resolve_keypath('/schemas%s' % key)
+                self.__resolve_keypath('/schemas%s' % keypath)
             )
 
             if schema_value is None:
-                logger.debug('could not retrieve schema_value: %s', key)
+                logger.debug('could not retrieve schema_value: %s', keypath)
                 return None
 
             if schema_value.type == gconf.VALUE_SCHEMA:
                 value = schema_value.get_schema().get_default_value()
-                self.client.set_value(key, value)
+                self.client.set_value(keypath, value)
             else:
                 raise config.ConfigError
 
@@ -69,9 +151,16 @@ class Config(config.Config):
 
 class RevelationIndicator(object):
 
-    def __init__(self, filename=''):
+    def __init__(self, filename='', prewarm=False):
+
+        ## (step, seconds) for each part of the startup
+        self.startup_times = []
+        started = time.time()
 
+        ## used instead of the file key if given
         self.filename = filename
+        ## whether to read the files ahead once the indicator is shown
+        self.prewarm = prewarm
 
         if os.path.exists(self.filename):
             logger.debug('using provided file: %s', self.filename)
@@ -83,26 +172,56 @@ class RevelationIndicator(object):
         )
 
         self.ind.set_status(appindicator.STATUS_ACTIVE)
+        self.startup_times.append(('indicator', time.time() - started))
 
         sys.excepthook = self.__cb_exception
 
+        ## only sets a flag, which is safe whenever the handler runs
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.arm())
+
+        ## files are loaded in worker threads
+        gobject.threads_init()
+
         gettext.bindtextdomain(config.PACKAGE, config.DIR_LOCALE)
         gettext.bind_textdomain_codeset(config.PACKAGE, "UTF-8")
         gettext.textdomain(config.PACKAGE)
 
         try:
-            self.__init_config(filename)
-            self.__init_facilities()
-            self.__init_ui()
+            self.__init_step('config', self.__init_config, filename)
+            self.__init_step('ui', self.__init_ui)
 
         except config.ConfigError:
-            dialog.Error(
-                None,
-                _('Missing configuration data'),
-                _('The applet could not find its configuration data, please'
-                  'reinstall Revelation.')
-            ).run()
-            sys.exit(1)
+            self.__config_error()
+
+        ## the rest is not needed until the menu is used, set it up once
+        ## the indicator is shown
+        gobject.idle_add(self.__cb_init_facilities)
+
+    def __init_step(self, name, func, *args):
+        "Runs a part of the startup and records how long it took"
+        started = time.time()
+        func(*args)
+        self.startup_times.append((name, time.time() - started))
+
+    def __config_error(self):
+        dialog.Error(
+            None,
+            _('Missing configuration data'),
+            _('The applet could not find its configuration data, please'
+              'reinstall Revelation.')
+        ).run()
+        sys.exit(1)
+
+    def __cb_init_facilities(self):
+        "Sets up facilities once the main loop is running"
+
+        try:
+            self.__init_step('facilities', self.__init_facilities)
+
+        except config.ConfigError:
+            self.__config_error()
+
+        return False
 
     def __init_config(self, filename=''):
         self.config = Config("/apps/revelation-indicator/prefs")
@@ -113,48 +232,41 @@ class RevelationIndicator(object):
         "Sets up facilities"
 
         self.clipboard = data.Clipboard()
-        self.datafile = io.DataFile(datahandler.Revelation)
-        self.entrystore = data.EntryStore()
+        ## copies entries without showing them, see entry_copychain
+        self.clipboard_chain = ClipboardChain()
+        ## launcher commands of entry types, parsed once
+        self.launchers = LauncherCache(self.config)
         #self.items = ui.ItemFactory(self.applet)
-        self.locktimer = data.Timer()
+
+        for database in self.databases:
+            database.init_facilities()
+
+            if self.prewarm:
+                database.prewarm()
 
         def timeout_callback(key, value, userdata):
             """
             Defining timeout callback for locking.
             """
-            if value:
-                self.locktimer.start(value * 60)
+            for database in self.databases:
+                database.set_autolock_timeout(value)
 
         self.config.monitor("autolock_timeout", timeout_callback)
-        self.config.monitor("file", self.__cb_config_file)
+        self.config.monitor("stream_load", self.__cb_config_stream_load)
+        self.config.monitor("skeleton_cache", self.__cb_config_skeleton_cache)
 
-        self.datafile.connect("changed", self.__cb_file_changed)
-        self.datafile.connect(
-            "content-changed",
-            self.__cb_file_content_changed
-        )
-        self.locktimer.connect("ring", self.__cb_file_autolock)
+        ## answers lookups of local scripts, if enabled
+        self.service = Service(self)
+        self.config.monitor("service", self.__cb_config_service)
+
+        ## the configured file, to tell when it changes
+        self.config_file = None
+        self.config.monitor("file", self.__cb_config_file)
+        self.config.monitor("files", self.__cb_config_files)
 
     def __init_ui(self):
         self.menu = gtk.Menu()
 
-        self.database_item = gtk.MenuItem(_('Database'))
-        self.database_item.show()
-        self.database_item.set_sensitive(False)
-
-        self.unlock_item = gtk.MenuItem(_('Unlock File'))
-        self.unlock_item.show()
-        self.unlock_item.connect(
-            'activate',
-            lambda w, d=None: self.file_open(self.config.get("file"))
-        )
-
-        self.lock_item = gtk.MenuItem(_('Lock File'))
-        self.lock_item.connect(
-            'activate',
-            lambda w, d=None: self.file_close()
-        )
-
         self.prefs_item = gtk.MenuItem(_('Preferences'))
         self.prefs_item.show()
         self.prefs_item.connect(
@@ -166,19 +278,37 @@ class RevelationIndicator(object):
         self.about_item.show()
         self.about_item.connect('activate', self.__cb_about)
 
+        self.stats_item = gtk.MenuItem(_('Statistics'))
+        self.stats_item.connect('activate', self.__cb_stats)
+
+        if instrument.enabled:
+            self.stats_item.show()
+
+        ## only offered while debugging, SIGUSR1 does the same
+        self.profile_item = gtk.MenuItem(_('Profile Next Unlock'))
+        self.profile_item.connect('activate', lambda w, d=None: profiler.arm())
+
+        if logger.isEnabledFor(logging.DEBUG):
+            self.profile_item.show()
+
         self.quit_item = gtk.MenuItem('Quit')
         self.quit_item.show()
-        self.quit_item.connect('activate', gtk.main_quit)
+        self.quit_item.connect('activate', lambda w, d=None: self.quit())
 
-        self.menu.append(self.database_item)
-        self.menu.append(gtk.SeparatorMenuItem())
-        self.menu.append(self.unlock_item)
-        self.menu.append(self.lock_item)
-        self.menu.append(gtk.SeparatorMenuItem())
         self.menu.append(self.prefs_item)
         self.menu.append(self.about_item)
+        self.menu.append(self.stats_item)
+        self.menu.append(self.profile_item)
         self.menu.append(self.quit_item)
 
+        ## one menu section per configured file, the one of the file key
+        ## first, in front of the items above
+        self.databases = []
+        self.database_add(Database(self, self.filename or self.config.get("file"), _('Database')))
+
+        for filename in self.__split_files(self.config.get("files")):
+            self.database_add(Database(self, filename, os.path.basename(filename)))
+
         self.ind.set_menu(self.menu)
         #self.menu.show_all()
 
@@ -193,160 +323,202 @@ class RevelationIndicator(object):
         ## set up various ui element holders
         self.popup_entryview = None
         self.popup_entrylist = None
+        self.popup_search = None
 
-    def file_close(self):
-        logger.debug(_("closing unlocked database file."))
-        ##FIXME: check how this works and if it is necessary
-        self.__close_popups()
-        self.locktimer.stop()
-
-        ##FIXME: calling a revelation method?
-        self.datafile.close()
-        self.entrystore.clear()
-
-        ##TODO: reset the menu entry
-        ##FIXME: is it required to remove subsubmenus first??
-        self.database_item.remove_submenu()
-        self.database_item.set_sensitive(False)
-
-        self.ind.set_icon("revelation-indicator-locked")
-        self.unlock_item.show()
-        self.lock_item.hide()
-
-    def file_open(self, file, password=None):
-        logger.debug(_("opening database file."))
-        try:
+        ## the entry popup is reused, these keep track of its last use
+        self.popup_focusafter = False
+        self.popup_owner = None
+        self.popup_started = None
+        self.popup_latency = None
+
+    def database_add(self, database):
+        "Adds the menu section of a database after those of the others"
+        position = sum(len(other.items()) for other in self.databases)
+
+        for item in database.items():
+            self.menu.insert(item, position)
+            position += 1
+
+        self.databases.append(database)
 
-            success = self.__file_load(file, password)
+    def database_remove(self, database):
+        "Locks a database and removes its menu section"
+        self.databases.remove(database)
+        database.destroy()
 
+    def update_icon(self):
+        "Shows the unlocked icon while any of the databases is unlocked"
+
+        if [database for database in self.databases if database.is_unlocked()]:
             self.ind.set_icon("revelation-indicator-unlocked")
-            self.lock_item.show()
-            self.unlock_item.hide()
-
-            return success
-
-        except dialog.CancelError:
-            pass
-
-        except datahandler.FormatError:
-            dialog.Error(None, _('Invalid file format'), _('The file \'%s\' contains invalid data.') % file).run()
-
-        except (datahandler.DataError, entry.EntryTypeError, entry.EntryFieldError):
-            dialog.Error(
-                None,
-                _('Unknown data'),
-                _(
-                    'The file \'%s\' contains unknown data. It may have been '
-                    'created by a more recent version of Revelation.'
-                ) % file
-            ).run()
-
-        except datahandler.PasswordError:
-            dialog.Error(
-                None,
-                _('Incorrect password'),
-                _(
-                    'You entered an incorrect password for the file '
-                    '\'%s\', please try again.'
-                ) % file
-            ).run()
-            self.file_open(file, None)
-
-        except datahandler.VersionError:
-            dialog.Error(
-                None,
-                _('Unknown data version'),
-                _('The file \'%s\' has a future version number, please upgrade Revelation to open it.') % file
-            ).run()
-
-        except IOError:
-            dialog.Error(
-                None,
-                _('Unable to open file'),
-                _('The file \'%s\' could not be opened. Make sure that the file exists, and that you have permissions to open it.') % file
-            ).run()
 
-        return False
+        else:
+            self.ind.set_icon("revelation-indicator-locked")
 
-    def prefs(self):
-        dialog.run_unique(Preferences, None, self.config)
+    def file_close(self):
+        "Locks all databases"
 
-    def __cb_config_file(self, key, value, data):
-            "Config callback for file key changes"
+        for database in self.databases:
+            database.file_close()
 
-            ###FIXME: is this really necessary???
-            ##self.file_close()
-            ##TODO: fix this
-            #self.applet.get_popup_component().set_prop("/commands/file-unlock", "sensitive", self.config.get("file") != "" and "1" or "0")
+    def quit(self):
+        "Wipes cached keys and secrets and quits"
 
-            pass
+        for database in self.databases:
+            if hasattr(database, "keycache"):
+                database.keycache.clear()
 
-    def __cb_file_autolock(self, widget, data=None):
-        "Callback for autolocking the file"
+        if hasattr(self, "clipboard_chain"):
+            self.clipboard_chain.clear()
 
-        if self.config.get("autolock"):
-            self.file_close()
+        secret.wipe_all()
 
-    def __cb_file_content_changed(self, widget, data=None):
-        "Callback for changed file content"
+        if hasattr(self, "service"):
+            self.service.stop()
 
-        try:
-            self.__file_load(self.datafile.get_file(), self.datafile.get_password())
+        gtk.main_quit()
 
-        except dialog.CancelError:
-            pass
+    def prefs(self):
+        dialog.run_unique(dialogs.Preferences, None, self.config)
 
-        except datahandler.PasswordError:
-            self.file_close()
+    def search(self, searchindex, callback):
+        """
+        Opens the popup for searching an unlocked file, callback is called
+        with the path of the chosen entry
+        """
+        self.close_popups()
 
-        except datahandler.Error:
-            pass
+        self.popup_search = dialogs.SearchPopup(searchindex, callback)
+        self.popup_search.connect("destroy", self.__cb_search_destroyed)
 
-    def __cb_file_changed(self, widget, data=None):
-        "Callback for changed data file"
-        logger.debug('file has been changed')
+        self.popup_search.realize()
+        x, y = self.__get_popup_offset(self.popup_search)
+        self.popup_search.show(x, y)
 
-        ##FIXME:
-        #popup = self.applet.get_popup_component()
+    def __cb_search_destroyed(self, widget):
+        "Forgets the search popup once it is closed"
+
+        if self.popup_search is widget:
+            self.popup_search = None
+
+    def search_changed(self, searchindex):
+        "Refreshes the results of the search popup if it searches searchindex"
+
+        popup = getattr(self, "popup_search", None)
+
+        if popup is not None and popup.index is searchindex:
+            popup.refresh()
 
-        #if self.datafile.get_file() == None:
-        #        self.entry.set_text("")
+    def __split_files(self, files):
+        "Splits the value of the files key into file names"
+        return [filename for filename in (files or '').split(os.pathsep) if filename]
 
-        #        popup.set_prop("/commands/file-unlock", "sensitive", self.config.get("file") != "" and "1" or "0")
-        #        popup.set_prop("/commands/file-lock", "sensitive", "0")
+    def __cb_config_file(self, key, value, data):
+            "Config callback for file key changes"
 
-        #        self.icon.set_from_stock(ui.STOCK_REVELATION_LOCKED, ui.ICON_SIZE_APPLET)
+            ###FIXME: is this really necessary???
+            ##self.file_close()
+            ##TODO: fix this
+            #self.applet.get_popup_component().set_prop("/commands/file-unlock", "sensitive", self.config.get("file") != "" and "1" or "0")
+
+            ## the skeleton of the previous file is of no use anymore
+            if self.config_file is not None and io.file_normpath(value) != io.file_normpath(self.config_file):
+                skeleton.remove(self.config_file)
 
-        #else:
-        #        popup.set_prop("/commands/file-unlock", "sensitive", "0")
-        #        popup.set_prop("/commands/file-lock", "sensitive", "1")
+            self.config_file = value
 
-        #        self.icon.set_from_stock(ui.STOCK_REVELATION, ui.ICON_SIZE_APPLET)
+            if not self.filename:
+                self.databases[0].filename = value
 
-    def __cb_popup_activate(self, widget, data=None):
-        self.locktimer.reset()
+    def __cb_config_files(self, key, value, data):
+        "Config callback for files key changes, adds and removes databases"
+        filenames = self.__split_files(value)
 
-        #action = self.config.get("menuaction")
+        for database in self.databases[1:]:
+            if database.filename not in filenames:
+                skeleton.remove(database.filename)
+                self.database_remove(database)
 
-        #if action == "show":
-        self.entry_show(data)
+        known = [database.filename for database in self.databases[1:]]
 
-        #elif action == "copy":
-        #    self.entry_copychain(data)
+        for filename in filenames:
+            if filename not in known:
+                database = Database(self, filename, os.path.basename(filename))
+                database.init_facilities()
+                self.database_add(database)
 
-        #elif self.__launcher_valid(data):
-        #    self.entry_goto(data)
+                if self.prewarm:
+                    database.prewarm()
 
-        #else:
-        #    self.entry_show(data)
+    def __cb_config_stream_load(self, key, value, data):
+        "Config callback for stream_load key changes"
 
-    def entry_show(self, e, focusafter=False):
-        self.__close_popups()
+        for database in self.databases:
+            database.loader.stream = bool(value)
 
-        self.popup_entryview = EntryViewPopup(e, self.config, self.clipboard)
+    def __cb_config_service(self, key, value, data):
+        "Config callback for service key changes"
 
-        if focusafter:
-            self.popup_entryview.connect("closed", lambda w: self.__focus_entry())
+        if not value:
+            self.service.stop()
+            return
+
+        try:
+            self.service.start()
+
+        except (IOError, OSError, socket.error):
+            logger.warning('unable to start the service on %s', self.service.path)
+
+    def __cb_config_skeleton_cache(self, key, value, data):
+        "Config callback for skeleton_cache key changes"
+
+        for database in self.databases:
+            database.loader.skeletons = bool(value)
+
+        if not value:
+            skeleton.remove()
+
+    def entry_copychain(self, e, owner=None):
+        """
+        Copies the passwords of an entry to the clipboard as a chain, with
+        the username first if chain_username is set. Entries without a
+        password are shown instead, on behalf of the owner database.
+        """
+
+        with instrument.span('entry_copy'):
+            secrets = [
+                field.value for field in e.fields
+                if field.datatype == entry.DATATYPE_PASSWORD and field.value
+            ]
+
+            if not secrets:
+                return self.entry_show(e, owner=owner)
+
+            if self.config.get("chain_username"):
+                secrets[0:0] = [
+                    field.value for field in e.fields
+                    if type(field) == entry.UsernameField and field.value
+                ]
+
+            self.clipboard_chain.set(secrets, self.config.get("clipboard_timeout"))
+
+    def entry_show(self, e, focusafter=False, owner=None):
+        """
+        Shows an entry in the entry popup, owner is the database the entry
+        belongs to, so locking another database leaves the popup alone
+        """
+        self.popup_started = time.time()
+        self.close_popups()
+
+        if self.popup_entryview is None:
+            self.popup_entryview = dialogs.EntryViewPopup(None, self.config, self.clipboard)
+            self.popup_entryview.connect("map-event", self.__cb_entryview_mapped)
+            self.popup_entryview.connect("closed", self.__cb_entryview_closed)
+            self.popup_entryview.realize()
+
+        self.popup_entryview.display_entry(e)
+        self.popup_focusafter = focusafter
+        self.popup_owner = owner
 
         def cb_goto(widget):
             if self.__launcher_valid(e):
@@ -357,93 +529,73 @@ class RevelationIndicator(object):
         #self.popup_entryview.button_goto.connect("clicked", cb_goto)
         #self.popup_entryview.button_goto.set_sensitive(self.__launcher_valid(e))
 
-        self.popup_entryview.realize()
         x, y = self.__get_popup_offset(self.popup_entryview)
         self.popup_entryview.show(x, y)
 
-    def __close_popups(self):
-        "Closes any open popups"
+    def __cb_entryview_closed(self, widget):
+        if self.popup_focusafter:
+            self.__focus_entry()
 
-        self.locktimer.reset()
+    def __cb_entryview_mapped(self, widget, event):
+        "Records how long it took to show the entry popup"
 
-        if hasattr(self, "popup_entryview") and self.popup_entryview is not None:
-            self.popup_entryview.destroy()
+        if self.popup_started is not None:
+            self.popup_latency = time.time() - self.popup_started
+            self.popup_started = None
 
-        if hasattr(self, "popup_entrylist") and self.popup_entrylist is not None:
-            self.popup_entrylist.destroy()
+            instrument.record('entry_show', self.popup_latency)
 
-    def __file_load(self, filename, password=None):
+            logger.debug('entry popup shown after %.4f seconds', self.popup_latency)
 
-        if not filename:
-            logger.debug("no revelation database provided")
-            return False
+    def close_popups(self, forget=False, owner=None):
+        """
+        Closes any open popups. The entry popup is only hidden and
+        cleared, with forget it is destroyed as well. With an owner
+        database only the popups showing its contents are closed.
+        """
 
-        if dialog.present_unique(dialog.PasswordOpen):
-            logger.debug('password dialog already opened')
-            return False
+        popup_search = getattr(self, "popup_search", None)
 
-        entrystore = self.datafile.load(
-            filename,
-            password,
-            lambda: dialog.run_unique(
-                dialog.PasswordOpen,
-                None,
-                os.path.basename(filename)
-            )
-        )
+        ## an entry shown without an owner may belong to any database
+        if owner is not None:
+            entryview = getattr(self, "popup_owner", None) in (None, owner)
+            search = popup_search is not None and popup_search.index is owner.searchindex
 
-        self.entrystore.clear()
-        self.entrystore.import_entry(entrystore, None)
+        else:
+            entryview = search = True
 
-        menu = self.__generate_entrymenu(self.entrystore)
-        self.database_item.set_submenu(menu)
-        self.database_item.set_sensitive(True)
+        if entryview and getattr(self, "popup_entryview", None) is not None:
+            if self.popup_entryview.get_property("visible"):
+                self.popup_entryview.close()
 
-        self.menu.show_all()
+            else:
+                self.popup_entryview.clear()
 
-        self.locktimer.start(self.config.get("autolock_timeout") * 60)
+            if forget:
+                self.popup_entryview.destroy()
+                self.popup_entryview = None
+                self.popup_owner = None
 
-        self.__close_popups()
+        if owner is None and getattr(self, "popup_entrylist", None) is not None:
+            self.popup_entrylist.destroy()
+            self.popup_entrylist = None
 
-        return True
+        if search and popup_search is not None:
+            self.popup_search.destroy()
+            self.popup_search = None
 
     def __focus_entry(self):
         ##FIXME:
         ##self.applet.request_focus(long(0))
         pass
 
-    def __generate_entrymenu(self, entrystore, parent=None):
-        menu = gtk.Menu()
-
-        for i in range(entrystore.iter_n_children(parent)):
-            iter = entrystore.iter_nth_child(parent, i)
-
-            e = entrystore.get_entry(iter)
-            item = ui.ImageMenuItem(type(e) == entry.FolderEntry and ui.STOCK_FOLDER or e.icon, e.name)
-            item.connect("select", lambda w, d=None: self.locktimer.reset())
-
-            if type(e) == entry.FolderEntry:
-                item.set_submenu(self.__generate_entrymenu(entrystore, iter))
-            else:
-                item.connect("activate", self.__cb_popup_activate, e)
-
-            menu.append(item)
-
-        return menu
-
     def __get_launcher(self, e):
-        command = self.config.get("/apps/revelation/launcher/%s" % e.id)
+        template = self.launchers.get(e.id)
 
-        if command in ("", None):
+        if template is None:
             return None
 
-        subst = {}
-        for field in e.fields:
-            subst[field.symbol] = field.value
-
-        command = util.parse_subst(command, subst)
-
-        return command
+        return template.expand(e)
 
     def __get_popup_offset(self, popup):
         x = gtk.gdk.screen_width() / 2
@@ -453,33 +605,15 @@ class RevelationIndicator(object):
 
     def __launcher_valid(self, e):
         try:
-            command = self.__get_launcher(e)
-
-            return command != None
+            template = self.launchers.get(e.id)
 
         except (util.SubstFormatError):
             return True
 
-        except (util.SubstValueError, config.ConfigError):
+        except (config.ConfigError):
             return False
 
-    def __require_file(self):
-        if self.datafile.get_file() != None:
-            return True
-
-        if self.config.get("file") != "":
-            return self.file_open(self.config.get("file"))
-
-        d = dialog.Info(
-            None, _('File not selected'),
-            _('You must select a Revelation data file to use - this can be done in the applet preferences.'),
-            ((gtk.STOCK_PREFERENCES, gtk.RESPONSE_ACCEPT), (gtk.STOCK_OK, gtk.RESPONSE_OK))
-        )
-
-        if d.run() == gtk.RESPONSE_ACCEPT:
-            self.prefs()
-
-        return False
+        return template is not None and template.is_valid(e)
 
     def __cb_about(self, item):
         dialog = gtk.AboutDialog()
@@ -490,6 +624,10 @@ class RevelationIndicator(object):
         dialog.run()
         dialog.destroy()
 
+    def __cb_stats(self, item):
+        "Writes the recorded timings and counters to stderr"
+        sys.stderr.write(instrument.report())
+
     def __cb_exception(self, type, value, trace):
 
         if type == KeyboardInterrupt:
@@ -502,130 +640,3 @@ class RevelationIndicator(object):
             gtk.main()
         else:
             sys.exit(1)
-
-
-class Preferences(dialog.Utility):
-
-    def __init__(self, parent, cfg):
-        dialog.Utility.__init__(self, parent, "Preferences")
-        self.config = cfg
-        self.set_modal(False)
-
-        self.notebook = ui.Notebook()
-        self.vbox.pack_start(self.notebook)
-
-        self.page_general = self.notebook.create_page(_('General'))
-        self.__init_section_file(self.page_general)
-        #self.__init_section_menuaction(self.page_general)
-        #self.__init_section_misc(self.page_general)
-
-        self.connect("response", lambda w, d: self.destroy())
-
-    def __init_section_file(self, page):
-        self.section_file = page.add_section(_('File Handling'))
-
-        # entry for file
-        self.button_file = ui.FileButton(_('Select File to Use'))
-        ui.config_bind(self.config, "file", self.button_file)
-
-        eventbox = ui.EventBox(self.button_file)
-        eventbox.set_tooltip_text(_('The data file to search for accounts in'))
-        self.section_file.append_widget(_('File to use'), eventbox)
-
-        # check-button for autolock
-        self.check_autolock = ui.CheckButton(_('Lock file when inactive for'))
-        ui.config_bind(self.config, "autolock", self.check_autolock)
-        self.check_autolock.connect("toggled", lambda w: self.spin_autolock_timeout.set_sensitive(w.get_active()))
-        self.check_autolock.set_tooltip_text(_('Automatically lock the file after a period of inactivity'))
-
-        # spin-entry for autolock-timeout
-        self.spin_autolock_timeout = ui.SpinEntry()
-        self.spin_autolock_timeout.set_range(1, 120)
-        self.spin_autolock_timeout.set_sensitive(self.check_autolock.get_active())
-        ui.config_bind(self.config, "autolock_timeout", self.spin_autolock_timeout)
-        self.spin_autolock_timeout.set_tooltip_text(_('The period of inactivity before locking the file, in minutes'))
-
-        # container for autolock-widgets
-        hbox = ui.HBox()
-        hbox.set_spacing(3)
-        hbox.pack_start(self.check_autolock)
-        hbox.pack_start(self.spin_autolock_timeout)
-        hbox.pack_start(ui.Label(_('minutes')))
-        self.section_file.append_widget(None, hbox)
-
-    #def __init_section_menuaction(self, page):
-    #    "Sets up a menuaction section in a page"
-
-    #    self.section_menuaction = page.add_section(_('Menu Action'))
-
-    #    # radio-button for show
-    #    self.radio_show = ui.RadioButton(None, _('Display account info'))
-    #    ui.config_bind(self.config, "menuaction", self.radio_show, "show")
-
-    #    self.radio_show.set_tooltip_text(_('Display the account information'))
-    #    self.section_menuaction.append_widget(None, self.radio_show)
-
-    #    # radio-button for goto
-    #    self.radio_goto = ui.RadioButton(self.radio_show, _('Go to account, if possible'))
-    #    ui.config_bind(self.config, "menuaction", self.radio_goto, "goto")
-
-    #    self.radio_goto.set_tooltip_text(_('Open the account in an external application if possible, otherwise display it'))
-    #    self.section_menuaction.append_widget(None, self.radio_goto)
-
-    #    # radio-button for copy username/password
-    #    self.radio_copy = ui.RadioButton(self.radio_show, _('Copy password to clipboard'))
-    #    ui.config_bind(self.config, "menuaction", self.radio_copy, "copy")
-
-    #    self.radio_copy.set_tooltip_text(_('Copy the account password to the clipboard'))
-    #    self.section_menuaction.append_widget(None, self.radio_copy)
-
-    #def __init_section_misc(self, page):
-    #    "Sets up the misc section"
-
-    #    self.section_misc = page.add_section(_('Miscellaneous'))
-
-    #    # show searchentry checkbutton
-    #    self.check_show_searchentry = ui.CheckButton(_('Show search entry'))
-    #    ui.config_bind(self.config, "show_searchentry", self.check_show_searchentry)
-
-    #    self.check_show_searchentry.set_tooltip_text(_('Display an entry box in the applet for searching'))
-    #    self.section_misc.append_widget(None, self.check_show_searchentry)
-
-    #    # show passwords checkbutton
-    #    self.check_show_passwords = ui.CheckButton(_('Show passwords and other secrets'))
-    #    ui.config_bind(self.config, "show_passwords", self.check_show_passwords)
-
-    #    self.check_show_passwords.set_tooltip_text(_('Display passwords and other secrets, such as PIN codes (otherwise, hide with ******)'))
-    #    self.section_misc.append_widget(None, self.check_show_passwords)
-
-    #    # check-button for username
-    #    self.check_chain_username = ui.CheckButton(_('Also copy username when copying password'))
-    #    ui.config_bind(self.config, "chain_username", self.check_chain_username)
-
-    #    self.check_chain_username.set_tooltip_text(_('When the password is copied to clipboard, put the username before the password as a clipboard "chain"'))
-    #    self.section_misc.append_widget(None, self.check_chain_username)
-
-    def run(self):
-            self.show_all()
-
-
-class EntryViewPopup(dialog.Popup):
-
-    def __init__(self, e, cfg=None, clipboard=None):
-        dialog.Popup.__init__(self)
-        self.set_title(e.name)
-
-        self.entryview = ui.EntryView(cfg, clipboard)
-        self.entryview.set_border_width(0)
-        self.entryview.display_entry(e)
-
-        self.button_close = ui.Button(gtk.STOCK_CLOSE, lambda w: self.close())
-        self.buttonbox = ui.HButtonBox(self.button_close)
-
-        self.vbox = ui.VBox(self.entryview, self.buttonbox)
-        self.vbox.set_border_width(12)
-        self.vbox.set_spacing(15)
-
-        self.add(self.vbox)
-
-        self.connect("show", lambda w: self.button_close.grab_focus())
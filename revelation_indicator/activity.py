@@ -0,0 +1,134 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+import ctypes
+import ctypes.util
+
+import gobject
+
+CLOCK_MONOTONIC = 1
+
+
+class timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def libc_monotonic():
+    """
+    Returns a clock reading CLOCK_MONOTONIC through clock_gettime of the C
+    library, for Python 2, which has no time.monotonic. Returns None if
+    that is not available.
+    """
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        clock_gettime = libc.clock_gettime
+
+    except (OSError, AttributeError):
+        return None
+
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    now = timespec()
+
+    def monotonic():
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(now)) != 0:
+            raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+
+        return now.tv_sec + now.tv_nsec * 1e-9
+
+    try:
+        monotonic()
+
+    except OSError:
+        return None
+
+    return monotonic
+
+
+## clock for measuring inactivity, unaffected by changes of the wall clock.
+## Only if neither time.monotonic nor clock_gettime are available the wall
+## clock is used, then setting the clock forward locks a file early and
+## setting it back delays locking by as much.
+clock = getattr(time, 'monotonic', None) or libc_monotonic() or time.time
+
+
+class ActivityTracker(object):
+    """
+    Locks a file after a period of inactivity. Recording activity only
+    stores a timestamp, which is cheap enough to do on every hover over a
+    menu item. Whether the timeout has passed since is checked by a single
+    timer every CHECK_INTERVAL seconds, so a file is locked up to that much
+    later than its timeout.
+
+    expired is called once the timeout has passed without activity.
+    """
+
+    CHECK_INTERVAL = 10
+
+    def __init__(self, expired, clock=clock):
+        self.expired = expired
+        self.clock = clock
+
+        self.timeout = None
+        self.last = None
+        self.source = None
+
+    def start(self, timeout):
+        "Starts tracking, expiring after timeout seconds without activity"
+        self.stop()
+
+        if not timeout:
+            return
+
+        self.timeout = timeout
+        self.last = self.clock()
+        self.source = gobject.timeout_add_seconds(
+            min(self.CHECK_INTERVAL, max(int(timeout), 1)), self.check
+        )
+
+    def stop(self):
+        "Stops tracking"
+
+        if self.source is not None:
+            gobject.source_remove(self.source)
+            self.source = None
+
+        self.timeout = None
+
+    def touch(self):
+        "Records activity"
+        self.last = self.clock()
+
+    def check(self):
+        """
+        Calls expired and stops tracking if the timeout has passed without
+        activity. Returns whether tracking goes on, for the timer.
+        """
+
+        if self.timeout is None:
+            return False
+
+        if self.clock() - self.last < self.timeout:
+            return True
+
+        ## the timer is removed by returning False
+        self.source = None
+        self.timeout = None
+        self.expired()
+
+        return False
@@ -0,0 +1,138 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Copying entry secrets to the clipboard without showing the entry.
+"""
+
+import gobject
+
+from revelation_indicator import secret
+from revelation_indicator.lazy import LazyModule
+
+gtk = LazyModule('gtk')
+
+
+class ClipboardChain(object):
+    """
+    Offers a chain of values on the clipboard and the primary selection.
+    The values are not handed to the X server up front but served from
+    the main loop whenever another application pastes: the first paste
+    gets the first value, every later one the next, up to the last. Each
+    selection goes through the chain on its own. The values are kept in a
+    SecretStore, which is wiped once other applications took over both
+    selections or the timeout passes.
+    """
+
+    TARGETS = [
+        ('UTF8_STRING', 0, 0),
+        ('STRING', 0, 0),
+        ('TEXT', 0, 0),
+        ('COMPOUND_TEXT', 0, 0),
+        ('text/plain', 0, 0),
+    ]
+
+    def __init__(self, clipboards=None):
+        if clipboards is None:
+            clipboards = [gtk.clipboard_get('CLIPBOARD'), gtk.clipboard_get('PRIMARY')]
+
+        self.clipboards = clipboards
+
+        self.secrets = None
+        self.chain = []
+        self.timeout = None
+
+        ## selections still owned, with the generation of their contents,
+        ## which tells callbacks of earlier contents from the current one
+        self.owners = {}
+        self.positions = {}
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.chain)
+
+    def set(self, values, timeout=None):
+        "Offers values as a chain, cleared after timeout seconds if given"
+        self.clear()
+
+        self.secrets = secret.SecretStore()
+        self.chain = [self.secrets.add(value) for value in values]
+        self.generation += 1
+
+        for clipboard in self.clipboards:
+            self.owners[clipboard] = self.generation
+            self.positions[clipboard] = 0
+
+            clipboard.set_with_data(self.TARGETS, self.__cb_get, self.__cb_clear, self.generation)
+
+        if timeout:
+            self.timeout = gobject.timeout_add_seconds(timeout, self.__cb_timeout)
+
+    def clear(self):
+        "Takes the values off the clipboard and wipes them"
+
+        if not self.chain:
+            return
+
+        ## clearing a clipboard reports back to __cb_clear, which ignores it
+        owned = list(self.owners)
+        self.__forget()
+
+        for clipboard in owned:
+            clipboard.clear()
+
+    def __forget(self):
+        self.owners.clear()
+        self.positions.clear()
+
+        if self.timeout is not None:
+            gobject.source_remove(self.timeout)
+            self.timeout = None
+
+        self.chain = []
+        self.secrets.wipe()
+        self.secrets = None
+
+    def __cb_get(self, clipboard, selectiondata, info, generation):
+        "Clipboard callback, hands out the next value of the chain"
+
+        if self.owners.get(clipboard) != generation or not self.chain:
+            return
+
+        position = self.positions[clipboard]
+        selectiondata.set_text(self.chain[position].reveal())
+        self.positions[clipboard] = min(position + 1, len(self.chain) - 1)
+
+    def __cb_clear(self, clipboard, generation):
+        """
+        Clipboard callback, another application took over a selection.
+        The values are wiped once no selection holds them anymore.
+        """
+
+        if self.owners.get(clipboard) != generation:
+            return
+
+        del self.owners[clipboard]
+        del self.positions[clipboard]
+
+        if not self.owners:
+            self.__forget()
+
+    def __cb_timeout(self):
+        self.timeout = None
+        self.clear()
+
+        return False
@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import collections
+
+
+## what is kept of an entry; parent is the index of the parent node or None
+CompactEntry = collections.namedtuple(
+    'CompactEntry',
+    'id name icon updated parent'
+)
+
+
+class CompactEntryStore(object):
+    """
+    Read-only stand-in for data.EntryStore that only keeps what the menu
+    needs to show an entry: its type, name and icon, plus the time it was
+    last updated to tell changed entries apart. Nothing secret is kept, so
+    full entries have to be loaded from the file again when needed.
+
+    Iters are plain node indexes, None is the root like in a TreeStore.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def clear(self):
+        "Removes all entries"
+        self.nodes = []
+        self.children = {None: []}
+
+    def add_entry(self, e, parent=None):
+        "Appends what is kept of e below parent, returns its iter"
+
+        node = len(self.nodes)
+        self.nodes.append(CompactEntry(e.id, e.name, e.icon, e.updated, parent))
+        self.children.setdefault(parent, []).append(node)
+
+        return node
+
+    def import_entry(self, source, sourceiter, parent=None):
+        "Copies the children of sourceiter in source below parent"
+
+        for i in range(source.iter_n_children(sourceiter)):
+            iter = source.iter_nth_child(sourceiter, i)
+            node = self.add_entry(source.get_entry(iter), parent)
+
+            if source.iter_has_child(iter):
+                self.import_entry(source, iter, node)
+
+    def get_entry(self, iter):
+        return self.nodes[iter]
+
+    def get_iter(self, path):
+        iter = None
+
+        for index in path:
+            ## unlike a list, a TreeStore has no negative indexes
+            if index < 0:
+                raise IndexError(index)
+
+            iter = self.children[iter][index]
+
+        return iter
+
+    def get_path(self, iter):
+        path = []
+
+        while iter is not None:
+            parent = self.nodes[iter].parent
+            path.insert(0, self.children[parent].index(iter))
+            iter = parent
+
+        return tuple(path)
+
+    def iter_has_child(self, iter):
+        return len(self.children.get(iter, ())) > 0
+
+    def iter_n_children(self, iter):
+        return len(self.children.get(iter, ()))
+
+    def iter_nth_child(self, iter, n):
+        return self.children[iter][n]
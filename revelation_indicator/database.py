@@ -0,0 +1,966 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import time
+
+import gobject
+
+import logging
+logger = logging.getLogger(__file__)
+
+import gtk
+
+import gettext
+_ = gettext.gettext
+
+from revelation_indicator import instrument, profiler, secret
+from revelation_indicator.activity import ActivityTracker
+from revelation_indicator.compact import CompactEntryStore
+from revelation_indicator.frecency import FrecencyTracker, find_paths
+from revelation_indicator.lazy import LazyModule
+from revelation_indicator.loader import FileLoader, FileUnchanged, ReloadScheduler
+from revelation_indicator.memory import resident_memory
+from revelation_indicator.menubuilder import MenuBuilder
+from revelation_indicator.rvl import KeyCache
+from revelation_indicator.search import SearchIndex
+
+## not needed to show the indicator, imported on first use
+data = LazyModule('revelation.data')
+datahandler = LazyModule('revelation.datahandler')
+dialog = LazyModule('revelation.dialog')
+entry = LazyModule('revelation.entry')
+io = LazyModule('revelation.io')
+ui = LazyModule('revelation.ui')
+
+
+class EntryError(Exception):
+    """
+    Raised when the entry at a path of the open file cannot be looked up.
+    The reason is one of 'not found', 'changed', 'busy' and 'locked', the
+    message is shown to the user.
+    """
+
+    def __init__(self, reason, message):
+        Exception.__init__(self, message)
+        self.reason = reason
+
+
+class Database(object):
+    """
+    One configured data file, shown as a section of the indicator menu.
+    Each database has its own lock state, autolock timer and worker, so
+    loading one file never holds up the others.
+    """
+
+    ## entries used most often, shown above the database item
+    FRECENT_ENTRIES = 5
+
+    def __init__(self, indicator, filename, label):
+        self.indicator = indicator
+        self.config = indicator.config
+        self.filename = filename
+        self.label = label
+
+        self.__init_ui()
+
+    def __init_ui(self):
+        self.frecent_items = []
+        for i in range(self.FRECENT_ENTRIES):
+            item = gtk.ImageMenuItem()
+            item.connect("activate", self.__cb_frecent_activate)
+            self.frecent_items.append(item)
+
+        self.database_item = gtk.MenuItem(self.label)
+        self.database_item.show()
+        self.database_item.set_sensitive(False)
+
+        self.search_item = gtk.MenuItem(_('Search...'))
+        self.search_item.connect(
+            'activate',
+            lambda w, d=None: self.search()
+        )
+
+        self.unlock_item = gtk.MenuItem(_('Unlock File'))
+        self.unlock_item.show()
+        self.unlock_item.set_sensitive(False)
+        self.unlock_item.connect(
+            'activate',
+            lambda w, d=None: self.file_open(self.filename)
+        )
+
+        self.lock_item = gtk.MenuItem(_('Lock File'))
+        self.lock_item.connect(
+            'activate',
+            lambda w, d=None: self.file_close()
+        )
+
+        self.separator_item = gtk.SeparatorMenuItem()
+        self.separator_item.show()
+
+        ## file and password of the load running in the worker
+        self.loading_file = None
+        self.loading_password = None
+        self.loading_started = None
+        self.memory_unlock = None
+
+    def init_facilities(self):
+        "Sets up facilities"
+
+        self.datafile = io.DataFile(datahandler.Revelation)
+        ## keys derived for the open file, wiped whenever it is locked
+        self.keycache = KeyCache()
+        self.loader = FileLoader(self.keycache)
+        self.loader.stream = bool(self.config.get("stream_load"))
+        self.loader.skeletons = bool(self.config.get("skeleton_cache"))
+        self.reloader = ReloadScheduler(
+            lambda: self.__profiled('file_content_changed', self.__file_reload)
+        )
+        self.searchindex = SearchIndex()
+        self.entrystore = data.EntryStore()
+        ## secret values of the entries in entrystore, wiped on lock
+        self.secrets = secret.SecretStore()
+        ## built folder submenus, keyed by their folder menu item
+        self.entrymenus = {}
+        ## builders still adding items to menus
+        self.menubuilders = []
+        ## locks the file when it was not used for autolock_timeout
+        self.activity = ActivityTracker(self.__cb_file_autolock)
+        ## activations of the entries of the file, and the paths of the
+        ## entries with the highest scores by their key
+        self.frecency = None
+        self.frecent = {}
+        self.frecent_paths = []
+
+        self.datafile.connect("changed", self.__cb_file_changed)
+        self.datafile.connect(
+            "content-changed",
+            self.__cb_file_content_changed
+        )
+
+        self.unlock_item.set_sensitive(True)
+
+    def items(self):
+        "Returns the menu items of the database section, in menu order"
+        return self.frecent_items + [
+            self.database_item,
+            self.search_item,
+            self.unlock_item,
+            self.lock_item,
+            self.separator_item,
+        ]
+
+    def destroy(self):
+        "Locks the file and removes the database section from the menu"
+
+        if hasattr(self, "datafile"):
+            self.file_close()
+
+        for item in self.items():
+            item.destroy()
+
+    def is_unlocked(self):
+        "Checks if the file of the database is unlocked"
+        return hasattr(self, "datafile") and self.datafile.get_file() is not None
+
+    def file_close(self):
+        logger.debug(_("closing unlocked database file."))
+        ## the entry popup may still show an entry of this file
+        self.indicator.close_popups(forget=True, owner=self)
+        self.activity.stop()
+        self.reloader.cancel()
+        self.keycache.clear()
+
+        ## a load that is still running must not unlock the file again
+        self.loading_password = None
+
+        ##FIXME: calling a revelation method?
+        self.datafile.close()
+        self.entrystore.clear()
+        self.secrets.wipe()
+        self.__cancel_menus()
+        self.entrymenus.clear()
+        self.searchindex.clear()
+        self.indicator.search_changed(self.searchindex)
+        self.frecent = {}
+        self.__update_frecent_items()
+
+        ##FIXME: is it required to remove subsubmenus first??
+        self.database_item.remove_submenu()
+        self.database_item.set_sensitive(False)
+
+        self.unlock_item.show()
+        self.lock_item.hide()
+        self.search_item.hide()
+
+        self.indicator.update_icon()
+
+    def prewarm(self):
+        "Reads the file ahead in the background, see FileLoader.prewarm"
+
+        if self.filename:
+            self.loader.prewarm(self.filename)
+
+    def file_open(self, file, password=None):
+        logger.debug(_("opening database file."))
+        try:
+            with instrument.span('file_open'):
+                return self.__profiled('file_open', self.__file_load, file, password)
+
+        except dialog.CancelError:
+            pass
+
+        return False
+
+    def search(self):
+        "Opens the popup for searching the unlocked file"
+        self.activity.touch()
+        self.indicator.search(
+            self.searchindex,
+            lambda path: self.get_entry(
+                path, lambda e: self.__cb_popup_activate(None, e, path)
+            )
+        )
+
+    def set_autolock_timeout(self, timeout):
+        "Restarts the autolock timer of an unlocked file with a new timeout"
+
+        if timeout and self.is_unlocked():
+            self.activity.start(timeout * 60)
+
+    def __cb_file_autolock(self):
+        "Callback for autolocking the file"
+
+        ## don't keep derived keys around while inactive, even unlocked
+        self.keycache.clear()
+
+        if self.config.get("autolock"):
+            self.file_close()
+
+    def __cb_file_content_changed(self, widget, data=None):
+        "Callback for changed file content"
+
+        try:
+            if self.database_item.get_submenu() is None:
+                self.__profiled(
+                    'file_content_changed',
+                    self.__file_load,
+                    self.datafile.get_file(),
+                    self.datafile.get_password()
+                )
+
+            else:
+                self.reloader.schedule(self.config.get("reload_delay") or 0)
+
+        except dialog.CancelError:
+            pass
+
+    def __cb_skeleton_loaded(self, entrystore):
+        """
+        Callback for the cached skeleton of a file the worker is loading.
+        The menu is built from it right away, and brought up to date once
+        the file itself is loaded.
+        """
+
+        if self.loading_password is None:
+            return
+
+        with instrument.span('file_load.skeleton_menu'):
+            self.entrystore.clear()
+            self.entrystore = entrystore
+            self.__cancel_menus()
+            self.entrymenus.clear()
+
+            menu = self.__generate_entrymenu(
+                self.entrystore,
+                lazy=self.config.get("lazy_menu")
+            )
+
+        self.database_item.set_submenu(menu)
+        self.database_item.set_sensitive(True)
+
+        instrument.record('file_load.first_paint', time.time() - self.loading_started)
+
+    def __cb_file_loaded(self, result):
+        "Callback for a data file loaded by the worker"
+
+        self.database_item.set_label(self.label)
+
+        if self.loading_password is None:
+            logger.debug('file was locked during load, dropping result')
+
+            ## the worker may have cached the key after the file was closed
+            self.keycache.clear()
+            result.prepared[0].wipe()
+            return
+
+        self.datafile.set_password(self.loading_password)
+        self.datafile.set_handler(result.handler)
+        self.datafile.set_file(result.filename)
+        self.loading_password = None
+
+        self.reloader.loaded(result)
+
+        ## the menu was built from the skeleton, only fix what differs
+        menu = self.database_item.get_submenu()
+
+        if menu is not None:
+            self.__finish_menus()
+
+            with instrument.span('file_load.reconcile'):
+                self.__reconcile_entrymenu(
+                    menu,
+                    result.entrystore,
+                    lazy=self.config.get("lazy_menu")
+                )
+
+        with instrument.span('file_load.import'):
+            self.entrystore.clear()
+            self.entrystore = self.__create_entrystore()
+            self.entrystore.import_entry(result.entrystore, None)
+
+        if menu is None:
+            ## submenus built for the previous store are stale now
+            self.__cancel_menus()
+            self.entrymenus.clear()
+
+            with instrument.span('file_load.menu'):
+                menu = self.__generate_entrymenu(
+                    self.entrystore,
+                    lazy=self.config.get("lazy_menu")
+                )
+            self.database_item.set_submenu(menu)
+            self.database_item.set_sensitive(True)
+
+        self.__take_prepared(result)
+
+        self.search_item.show()
+        self.lock_item.show()
+        self.unlock_item.hide()
+
+        self.indicator.update_icon()
+
+        self.activity.start(self.config.get("autolock_timeout") * 60)
+
+        self.indicator.close_popups()
+
+        instrument.record('file_load', time.time() - self.loading_started)
+
+        ## the loaded entrystore is only released once this returns
+        gobject.idle_add(self.__cb_report_memory)
+
+    def __cb_report_memory(self):
+        "Logs the resident memory from before and after the last unlock"
+
+        if self.memory_unlock is not None:
+            logger.debug(
+                'resident memory before unlock: %.1f MiB, after: %.1f MiB',
+                self.memory_unlock / 1048576.0,
+                (resident_memory() or 0) / 1048576.0
+            )
+
+        return False
+
+    def __cb_file_load_error(self, error):
+        "Callback for a data file the worker failed to load"
+        file = self.loading_file
+
+        self.database_item.set_label(self.label)
+
+        if self.loading_password is None:
+            logger.debug('file was locked during load, dropping error')
+            return
+
+        self.loading_password = None
+
+        ## take down the menu built from the skeleton
+        if self.database_item.get_submenu() is not None:
+            self.file_close()
+
+        try:
+            raise error
+
+        except datahandler.FormatError:
+            dialog.Error(None, _('Invalid file format'), _('The file \'%s\' contains invalid data.') % file).run()
+
+        except (datahandler.DataError, entry.EntryTypeError, entry.EntryFieldError):
+            dialog.Error(
+                None,
+                _('Unknown data'),
+                _(
+                    'The file \'%s\' contains unknown data. It may have been '
+                    'created by a more recent version of Revelation.'
+                ) % file
+            ).run()
+
+        except datahandler.PasswordError:
+            dialog.Error(
+                None,
+                _('Incorrect password'),
+                _(
+                    'You entered an incorrect password for the file '
+                    '\'%s\', please try again.'
+                ) % file
+            ).run()
+            self.file_open(file, None)
+
+        except datahandler.VersionError:
+            dialog.Error(
+                None,
+                _('Unknown data version'),
+                _('The file \'%s\' has a future version number, please upgrade Revelation to open it.') % file
+            ).run()
+
+        except IOError:
+            dialog.Error(
+                None,
+                _('Unable to open file'),
+                _('The file \'%s\' could not be opened. Make sure that the file exists, and that you have permissions to open it.') % file
+            ).run()
+
+    def __cb_file_reloaded(self, result):
+        "Callback for the open data file reloaded by the worker"
+
+        if self.datafile.get_file() is None:
+            logger.debug('file was locked during reload, dropping result')
+
+            ## the worker may have cached the key after the file was closed
+            self.keycache.clear()
+            result.prepared[0].wipe()
+            return
+
+        self.__finish_menus()
+
+        with instrument.span('file_content_changed.reconcile'):
+            changed = self.__reconcile_entrymenu(
+                self.database_item.get_submenu(),
+                result.entrystore,
+                lazy=self.config.get("lazy_menu")
+            )
+
+        with instrument.span('file_content_changed.import'):
+            self.entrystore.clear()
+            self.entrystore.import_entry(result.entrystore, None)
+
+        self.__take_prepared(result)
+        self.reloader.finished(result)
+
+        instrument.count('file_content_changed.nodes', changed)
+        instrument.record('file_content_changed', time.time() - self.loading_started)
+
+        logger.debug('reloaded database file, %d menu nodes changed', changed)
+
+    def __cb_file_reload_error(self, error):
+        "Callback for the open data file the worker failed to reload"
+
+        if isinstance(error, FileUnchanged):
+            logger.debug('file contents did not change, nothing to reload')
+
+            ## so later notifications without changes are skipped
+            self.reloader.finished(stat=error.stat)
+            return
+
+        self.reloader.finished()
+
+        if isinstance(error, datahandler.PasswordError):
+            self.file_close()
+
+        elif not isinstance(error, datahandler.Error):
+            raise error
+
+    def __cb_file_changed(self, widget, data=None):
+        "Callback for changed data file"
+        logger.debug('file has been changed')
+
+    def __cb_popup_activate(self, widget, data=None, path=None):
+        self.activity.touch()
+
+        if path is not None:
+            self.__record_activation(path)
+
+        action = self.config.get("menuaction")
+
+        if action == "copy":
+            self.indicator.entry_copychain(data, owner=self)
+
+        #elif self.__launcher_valid(data):
+        #    self.entry_goto(data)
+
+        else:
+            self.indicator.entry_show(data, owner=self)
+
+    def __profiled(self, name, load, *args):
+        """
+        Calls load, which starts a load in the worker, and profiles both
+        if profiling is armed. load is passed the token of the profile,
+        which is finished by the loader once the load is done, or here if
+        it did not start.
+        """
+        profile = profiler.start(name)
+        started = False
+
+        try:
+            started = load(*args, profile=profile)
+            return started
+
+        finally:
+            if not started:
+                profiler.finish(profile)
+
+    def __file_load(self, filename, password=None, profile=None):
+
+        if not filename:
+            logger.debug("no revelation database provided")
+            return False
+
+        if dialog.present_unique(dialog.PasswordOpen):
+            logger.debug('password dialog already opened')
+            return False
+
+        if self.loader.is_busy():
+            logger.debug('database file is already being loaded')
+            return False
+
+        if password is None:
+            password = dialog.run_unique(
+                dialog.PasswordOpen,
+                None,
+                os.path.basename(filename)
+            )
+
+        ## the cached keys belong to the password of the last unlock
+        self.keycache.clear()
+
+        if self.frecency is None or self.frecency.filename != io.file_normpath(filename):
+            self.frecency = FrecencyTracker(io.file_normpath(filename))
+
+        frecency = self.frecency
+        keys = set(frecency.top())
+        compact = self.config.get("compact_store")
+
+        self.loading_file = filename
+        self.loading_password = password
+        self.loading_started = time.time()
+        self.memory_unlock = resident_memory()
+        self.database_item.set_label(_('Unlocking...'))
+
+        return self.loader.load(
+            filename,
+            password,
+            self.__cb_file_loaded,
+            self.__cb_file_load_error,
+            lambda entrystore: self.__prepare(entrystore, frecency, keys, compact),
+            paint=self.__cb_skeleton_loaded,
+            profile=profile
+        )
+
+    def __file_reload(self, profile=None):
+        "Reloads the open file, changing only the menu items that differ"
+        self.loading_started = time.time()
+
+        frecency = self.frecency
+        keys = set(frecency.top())
+        compact = isinstance(self.entrystore, CompactEntryStore)
+
+        return self.loader.load(
+            self.datafile.get_file(),
+            self.datafile.get_password(),
+            self.__cb_file_reloaded,
+            self.__cb_file_reload_error,
+            lambda entrystore: self.__prepare(entrystore, frecency, keys, compact),
+            self.reloader.digest,
+            profile=profile
+        )
+
+    def __prepare(self, entrystore, frecency, keys, compact):
+        """
+        Called in the worker with a loaded entrystore. Moves the secret
+        values of its entries into a new SecretStore, indexes it for
+        searching and finds the paths of the entries of frecency with the
+        given keys, returns all three. A compact entrystore keeps no
+        secrets, entries are loaded on demand, so the store stays empty.
+        """
+        secrets = secret.SecretStore()
+
+        if not compact:
+            secret.protect(entrystore, secrets)
+
+        return (
+            secrets,
+            SearchIndex().build(entrystore),
+            find_paths(frecency, entrystore, keys)
+        )
+
+    def __take_prepared(self, result):
+        """
+        Takes the secrets, search index and frecent entries of a load,
+        wipes the old secrets and refreshes an open search popup
+        """
+        secrets, searchindex, self.frecent = result.prepared
+
+        ## an open search popup holds on to the index, update it in place
+        self.searchindex.update(searchindex)
+        self.indicator.search_changed(self.searchindex)
+
+        secrets, self.secrets = self.secrets, secrets
+        secrets.wipe()
+
+        self.__update_frecent_items()
+
+    def __record_activation(self, path):
+        "Adds to the score of the entry at path"
+        names = tuple(
+            self.entrystore.get_entry(self.entrystore.get_iter(path[:i + 1])).name
+            for i in range(len(path))
+        )
+
+        self.frecent[self.frecency.record(names)] = path
+        self.__update_frecent_items()
+
+    def __update_frecent_items(self):
+        "Shows the entries with the highest scores above the database item"
+        self.frecent_paths = []
+
+        if self.frecent:
+            self.frecent_paths = [
+                self.frecent[key] for key in self.frecency.top() if key in self.frecent
+            ][:len(self.frecent_items)]
+
+        for i, item in enumerate(self.frecent_items):
+            if i >= len(self.frecent_paths):
+                item.hide()
+                continue
+
+            e = self.entrystore.get_entry(self.entrystore.get_iter(self.frecent_paths[i]))
+            item.set_label(e.name)
+            item.set_image(gtk.image_new_from_stock(e.icon, gtk.ICON_SIZE_MENU))
+            item.show()
+
+    def __cb_frecent_activate(self, item):
+        "Callback for activated items of frecent entries"
+        path = self.frecent_paths[self.frecent_items.index(item)]
+
+        self.get_entry(path, lambda e: self.__cb_popup_activate(item, e, path))
+
+    def __generate_entrymenu(self, entrystore, parent=None, lazy=False):
+        """
+        Creates the menu for the children of parent. Its items are added
+        by a MenuBuilder, see __finish_menus.
+        """
+        menu = gtk.Menu()
+
+        self.menubuilders.append(MenuBuilder(
+            menu,
+            entrystore.iter_n_children(parent),
+            lambda i: self.__generate_entryitem(
+                entrystore, entrystore.iter_nth_child(parent, i), lazy
+            )
+        ))
+
+        return menu
+
+    def __finish_menus(self):
+        "Adds the items still missing from menus right away"
+
+        for builder in self.menubuilders:
+            builder.finish()
+
+        del self.menubuilders[:]
+
+    def __cancel_menus(self):
+        "Stops adding items to menus that are thrown away"
+
+        for builder in self.menubuilders:
+            builder.cancel()
+
+        del self.menubuilders[:]
+
+    def __generate_entryitem(self, entrystore, iter, lazy=False):
+        """
+        Creates and shows the menu item for a single entry. All items share
+        the same signal handlers, which look up the entry by the position of
+        the item.
+        """
+
+        e = entrystore.get_entry(iter)
+        item = ui.ImageMenuItem(e.id == entry.FolderEntry.id and ui.STOCK_FOLDER or e.icon, e.name)
+        item.connect("select", self.__cb_item_select)
+
+        ## before the submenu is attached, which has its own builder
+        item.show_all()
+
+        if e.id == entry.FolderEntry.id and lazy:
+            item.set_submenu(self.__generate_placeholder())
+
+        elif e.id == entry.FolderEntry.id:
+            self.entrymenus[item] = self.__generate_entrymenu(entrystore, iter)
+            item.set_submenu(self.entrymenus[item])
+
+        else:
+            item.connect("activate", self.__cb_entry_activate)
+
+        return item
+
+    def __generate_placeholder(self):
+        "Creates the submenu shown for a folder until it is built"
+        menu = gtk.Menu()
+
+        item = gtk.MenuItem(_('Loading...'))
+        item.set_sensitive(False)
+        item.show()
+        menu.append(item)
+
+        return menu
+
+    def __get_item_path(self, item):
+        "Returns the entrystore path of the entry shown by a menu item"
+        path = []
+
+        while item is not self.database_item:
+            menu = item.get_parent()
+            path.insert(0, menu.get_children().index(item))
+            item = menu.get_attach_widget()
+
+        return tuple(path)
+
+    def get_entry(self, path, callback, errback=None):
+        """
+        Calls callback with a copy of the entry stored at path, with its
+        secret values filled in. A compact entrystore has no full entries,
+        so in that case the file is loaded again in the worker and the
+        entry is taken from there. If the entry cannot be looked up,
+        errback is called with the error instead, by default it is shown
+        in an error dialog.
+        """
+        if errback is None:
+            errback = self.__cb_entry_error
+
+        try:
+            shown = self.entrystore.get_entry(self.entrystore.get_iter(path))
+
+        except (IndexError, KeyError, TypeError, ValueError):
+            errback(EntryError('not found', _('The entry does not exist in the file.')))
+            return
+
+        if not isinstance(self.entrystore, CompactEntryStore):
+            callback(secret.reveal(shown))
+            return
+
+        def cb_loaded(result):
+            ## the file may have been locked while the entry was loaded
+            if self.datafile.get_file() is None:
+                errback(EntryError('locked', _('The file was locked.')))
+                return
+
+            try:
+                e = result.entrystore.get_entry(result.entrystore.get_iter(path))
+
+            except (IndexError, ValueError):
+                e = None
+
+            ## path is only valid as long as the file matches the menu
+            if e is None or e.id != shown.id or e.name != shown.name:
+                errback(EntryError('changed', _(
+                    'The file has changed since it was opened, lock and '
+                    'unlock it to see the changes.'
+                )))
+
+            else:
+                callback(e)
+
+        def cb_error(error):
+            if isinstance(error, datahandler.PasswordError):
+                self.file_close()
+
+            errback(error)
+
+        if not self.loader.load(
+            self.datafile.get_file(),
+            self.datafile.get_password(),
+            cb_loaded,
+            cb_error
+        ):
+            errback(EntryError('busy', _(
+                'The file is being loaded, please try again in a moment.'
+            )))
+
+    def __cb_entry_error(self, error):
+        "Shows the error of an entry that could not be looked up"
+
+        if isinstance(error, datahandler.PasswordError):
+            ## the file was changed to another password, and closed
+            return
+
+        elif isinstance(error, EntryError):
+            if error.reason == 'locked':
+                return
+
+            dialog.Error(None, _('Unable to open entry'), str(error)).run()
+
+        elif isinstance(error, (datahandler.Error, IOError)):
+            dialog.Error(
+                None,
+                _('Unable to open entry'),
+                _('The file \'%s\' could not be read again to open the entry.') % self.datafile.get_file()
+            ).run()
+
+        else:
+            raise error
+
+    def __create_entrystore(self):
+        "Creates the entrystore for a newly opened file"
+
+        if self.config.get("compact_store"):
+            return CompactEntryStore()
+
+        return data.EntryStore()
+
+    def __cb_entry_activate(self, item):
+        "Callback for activated entry items"
+        path = self.__get_item_path(item)
+
+        self.get_entry(path, lambda e: self.__cb_popup_activate(item, e, path))
+
+    def __cb_item_select(self, item):
+        """
+        Callback for selected entry items, builds the submenu of a lazy
+        folder the first time it is shown
+        """
+        self.activity.touch()
+
+        if item.get_submenu() is None or item in self.entrymenus:
+            return
+
+        menu = self.__generate_entrymenu(
+            self.entrystore,
+            self.entrystore.get_iter(self.__get_item_path(item)),
+            lazy=True
+        )
+
+        self.entrymenus[item] = menu
+        item.set_submenu(menu)
+
+    def __forget_entrymenus(self, item):
+        "Drops the cached submenus below a folder item"
+        menu = self.entrymenus.pop(item, None)
+
+        if menu is not None:
+            for child in menu.get_children():
+                self.__forget_entrymenus(child)
+
+    def __entry_signature(self, e):
+        """
+        Returns what is compared to find changed entries. Revelation
+        updates the timestamp on every edit, and it is also kept by a
+        compact entrystore.
+        """
+        return (e.icon, e.updated)
+
+    def __reconcile_entrymenu(self, menu, entrystore, olditer=None, newiter=None, lazy=False):
+        """
+        Updates menu, which shows the children of olditer in the current
+        entrystore, to show the children of newiter in entrystore instead.
+        Entries are matched by type and name, unmatched entries of the same
+        type are treated as renames. Returns the number of changed nodes.
+        """
+        old = []
+        for i in range(self.entrystore.iter_n_children(olditer)):
+            iter = self.entrystore.iter_nth_child(olditer, i)
+            old.append((iter, self.entrystore.get_entry(iter)))
+
+        new = []
+        for i in range(entrystore.iter_n_children(newiter)):
+            iter = entrystore.iter_nth_child(newiter, i)
+            new.append((iter, entrystore.get_entry(iter)))
+
+        items = menu.get_children()
+
+        candidates = {}
+        for j, (iter, e) in enumerate(old):
+            candidates.setdefault((e.id, e.name), []).append(j)
+
+        matches = {}
+        for i, (iter, e) in enumerate(new):
+            if candidates.get((e.id, e.name)):
+                matches[i] = candidates[(e.id, e.name)].pop(0)
+
+        leftover = sorted(set(range(len(old))) - set(matches.values()))
+        for i, (iter, e) in enumerate(new):
+            if i in matches:
+                continue
+
+            for j in leftover:
+                if old[j][1].id == e.id:
+                    matches[i] = j
+                    leftover.remove(j)
+                    break
+
+        changed = 0
+
+        for j in leftover:
+            self.__forget_entrymenus(items[j])
+            menu.remove(items[j])
+            items[j].destroy()
+            changed += 1
+
+        for i, (iter, e) in enumerate(new):
+
+            if i not in matches:
+                item = self.__generate_entryitem(entrystore, iter, lazy)
+                menu.insert(item, i)
+                changed += 1
+                continue
+
+            olditer, olde = old[matches[i]]
+            item = items[matches[i]]
+
+            if e.id == entry.FolderEntry.id:
+                if olde.name != e.name:
+                    item.set_text(e.name)
+                    changed += 1
+
+                if item in self.entrymenus:
+                    changed += self.__reconcile_entrymenu(
+                        self.entrymenus[item], entrystore, olditer, iter, lazy
+                    )
+
+            elif olde.name != e.name or self.__entry_signature(olde) != self.__entry_signature(e):
+                item.set_text(e.name)
+                item.set_stock(e.icon)
+                changed += 1
+
+            menu.reorder_child(item, i)
+
+        return changed
+
+    def __require_file(self):
+        if self.datafile.get_file() != None:
+            return True
+
+        if self.filename != "":
+            return self.file_open(self.filename)
+
+        d = dialog.Info(
+            None, _('File not selected'),
+            _('You must select a Revelation data file to use - this can be done in the applet preferences.'),
+            ((gtk.STOCK_PREFERENCES, gtk.RESPONSE_ACCEPT), (gtk.STOCK_OK, gtk.RESPONSE_OK))
+        )
+
+        if d.run() == gtk.RESPONSE_ACCEPT:
+            self.indicator.prefs()
+
+        return False
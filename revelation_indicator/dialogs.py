@@ -0,0 +1,243 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import gtk
+
+import gettext
+_ = gettext.gettext
+
+from revelation import dialog, ui
+
+
+class Preferences(dialog.Utility):
+
+    def __init__(self, parent, cfg):
+        dialog.Utility.__init__(self, parent, "Preferences")
+        self.config = cfg
+        self.set_modal(False)
+
+        self.notebook = ui.Notebook()
+        self.vbox.pack_start(self.notebook)
+
+        self.page_general = self.notebook.create_page(_('General'))
+        self.__init_section_file(self.page_general)
+        #self.__init_section_menuaction(self.page_general)
+        #self.__init_section_misc(self.page_general)
+
+        self.connect("response", lambda w, d: self.destroy())
+
+    def __init_section_file(self, page):
+        self.section_file = page.add_section(_('File Handling'))
+
+        # entry for file
+        self.button_file = ui.FileButton(_('Select File to Use'))
+        ui.config_bind(self.config, "file", self.button_file)
+
+        eventbox = ui.EventBox(self.button_file)
+        eventbox.set_tooltip_text(_('The data file to search for accounts in'))
+        self.section_file.append_widget(_('File to use'), eventbox)
+
+        # check-button for autolock
+        self.check_autolock = ui.CheckButton(_('Lock file when inactive for'))
+        ui.config_bind(self.config, "autolock", self.check_autolock)
+        self.check_autolock.connect("toggled", lambda w: self.spin_autolock_timeout.set_sensitive(w.get_active()))
+        self.check_autolock.set_tooltip_text(_('Automatically lock the file after a period of inactivity'))
+
+        # spin-entry for autolock-timeout
+        self.spin_autolock_timeout = ui.SpinEntry()
+        self.spin_autolock_timeout.set_range(1, 120)
+        self.spin_autolock_timeout.set_sensitive(self.check_autolock.get_active())
+        ui.config_bind(self.config, "autolock_timeout", self.spin_autolock_timeout)
+        self.spin_autolock_timeout.set_tooltip_text(_('The period of inactivity before locking the file, in minutes'))
+
+        # container for autolock-widgets
+        hbox = ui.HBox()
+        hbox.set_spacing(3)
+        hbox.pack_start(self.check_autolock)
+        hbox.pack_start(self.spin_autolock_timeout)
+        hbox.pack_start(ui.Label(_('minutes')))
+        self.section_file.append_widget(None, hbox)
+
+    #def __init_section_menuaction(self, page):
+    #    "Sets up a menuaction section in a page"
+
+    #    self.section_menuaction = page.add_section(_('Menu Action'))
+
+    #    # radio-button for show
+    #    self.radio_show = ui.RadioButton(None, _('Display account info'))
+    #    ui.config_bind(self.config, "menuaction", self.radio_show, "show")
+
+    #    self.radio_show.set_tooltip_text(_('Display the account information'))
+    #    self.section_menuaction.append_widget(None, self.radio_show)
+
+    #    # radio-button for goto
+    #    self.radio_goto = ui.RadioButton(self.radio_show, _('Go to account, if possible'))
+    #    ui.config_bind(self.config, "menuaction", self.radio_goto, "goto")
+
+    #    self.radio_goto.set_tooltip_text(_('Open the account in an external application if possible, otherwise display it'))
+    #    self.section_menuaction.append_widget(None, self.radio_goto)
+
+    #    # radio-button for copy username/password
+    #    self.radio_copy = ui.RadioButton(self.radio_show, _('Copy password to clipboard'))
+    #    ui.config_bind(self.config, "menuaction", self.radio_copy, "copy")
+
+    #    self.radio_copy.set_tooltip_text(_('Copy the account password to the clipboard'))
+    #    self.section_menuaction.append_widget(None, self.radio_copy)
+
+    #def __init_section_misc(self, page):
+    #    "Sets up the misc section"
+
+    #    self.section_misc = page.add_section(_('Miscellaneous'))
+
+    #    # show searchentry checkbutton
+    #    self.check_show_searchentry = ui.CheckButton(_('Show search entry'))
+    #    ui.config_bind(self.config, "show_searchentry", self.check_show_searchentry)
+
+    #    self.check_show_searchentry.set_tooltip_text(_('Display an entry box in the applet for searching'))
+    #    self.section_misc.append_widget(None, self.check_show_searchentry)
+
+    #    # show passwords checkbutton
+    #    self.check_show_passwords = ui.CheckButton(_('Show passwords and other secrets'))
+    #    ui.config_bind(self.config, "show_passwords", self.check_show_passwords)
+
+    #    self.check_show_passwords.set_tooltip_text(_('Display passwords and other secrets, such as PIN codes (otherwise, hide with ******)'))
+    #    self.section_misc.append_widget(None, self.check_show_passwords)
+
+    #    # check-button for username
+    #    self.check_chain_username = ui.CheckButton(_('Also copy username when copying password'))
+    #    ui.config_bind(self.config, "chain_username", self.check_chain_username)
+
+    #    self.check_chain_username.set_tooltip_text(_('When the password is copied to clipboard, put the username before the password as a clipboard "chain"'))
+    #    self.section_misc.append_widget(None, self.check_chain_username)
+
+    def run(self):
+            self.show_all()
+
+
+class EntryViewPopup(dialog.Popup):
+    """
+    Popup showing a single entry. The popup is meant to be kept around
+    and reused: display_entry() replaces the shown entry and close() only
+    hides the popup, after removing the entry from its widgets.
+    """
+
+    def __init__(self, e=None, cfg=None, clipboard=None):
+        dialog.Popup.__init__(self)
+
+        self.entryview = ui.EntryView(cfg, clipboard)
+        self.entryview.set_border_width(0)
+
+        self.button_close = ui.Button(gtk.STOCK_CLOSE, lambda w: self.close())
+        self.buttonbox = ui.HButtonBox(self.button_close)
+
+        self.vbox = ui.VBox(self.entryview, self.buttonbox)
+        self.vbox.set_border_width(12)
+        self.vbox.set_spacing(15)
+
+        self.add(self.vbox)
+
+        self.connect("show", lambda w: self.button_close.grab_focus())
+
+        if e is not None:
+            self.display_entry(e)
+
+    def close(self):
+        "Hides the popup, without keeping the revealed entry in its widgets"
+        gtk.gdk.pointer_ungrab()
+        gtk.gdk.keyboard_ungrab()
+
+        self.hide()
+        self.clear()
+        self.emit("closed")
+
+    def clear(self):
+        "Removes the shown entry, and with it its secret values"
+        self.set_title('')
+        self.entryview.clear()
+
+    def display_entry(self, e):
+        "Shows e in the popup"
+        self.set_title(e.name)
+        self.entryview.display_entry(e)
+
+
+class SearchPopup(dialog.Popup):
+    "Popup for searching the entries of the unlocked file"
+
+    MAX_RESULTS = 50
+
+    def __init__(self, index, callback):
+        dialog.Popup.__init__(self)
+        self.set_title(_('Search'))
+
+        self.index = index
+        self.callback = callback
+
+        self.entry = ui.Entry()
+        self.entry.connect("changed", self.__cb_changed)
+        self.entry.connect("activate", self.__cb_activate)
+
+        ## columns: stock icon, name, entrystore path
+        self.results = gtk.ListStore(str, str, object)
+
+        self.resultview = gtk.TreeView(self.results)
+        self.resultview.set_headers_visible(False)
+        self.resultview.connect("row-activated", self.__cb_row_activated)
+
+        column = gtk.TreeViewColumn()
+        cell = gtk.CellRendererPixbuf()
+        column.pack_start(cell, False)
+        column.add_attribute(cell, "stock-id", 0)
+        cell = gtk.CellRendererText()
+        column.pack_start(cell, True)
+        column.add_attribute(cell, "text", 1)
+        self.resultview.append_column(column)
+
+        self.scrolledwindow = ui.ScrolledWindow(self.resultview)
+        self.scrolledwindow.set_size_request(300, 200)
+
+        self.button_close = ui.Button(gtk.STOCK_CLOSE, lambda w: self.close())
+        self.buttonbox = ui.HButtonBox(self.button_close)
+
+        self.vbox = ui.VBox(self.entry, self.scrolledwindow, self.buttonbox)
+        self.vbox.set_border_width(12)
+        self.vbox.set_spacing(6)
+
+        self.add(self.vbox)
+
+        self.connect("show", lambda w: self.entry.grab_focus())
+
+    def refresh(self):
+        "Searches the index again, after it has changed"
+        self.__cb_changed(self.entry)
+
+    def __cb_changed(self, widget):
+        self.results.clear()
+
+        for path, name, icon in self.index.search(self.entry.get_text(), self.MAX_RESULTS):
+            self.results.append((icon, name, path))
+
+    def __cb_activate(self, widget):
+        if len(self.results) > 0:
+            self.__select(self.results[0][2])
+
+    def __cb_row_activated(self, treeview, path, column):
+        self.__select(self.results[path][2])
+
+    def __select(self, path):
+        self.close()
+        self.callback(path)
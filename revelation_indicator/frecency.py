@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Entries used most often and most recently, per data file.
+
+Each activation of an entry adds to its score, and scores halve every
+HALF_LIFE seconds, so entries used a lot recently rank first. Entries are
+told apart by the names along their path, which stay the same when
+entries are moved around in the file. Only the KEEP highest scores are
+kept; on disk they are stored under salted hashes of those names, so the
+file does not tell which entries are in the data file.
+"""
+
+import os
+import hmac
+import json
+import time
+import hashlib
+
+from revelation_indicator import skeleton
+from revelation_indicator.lazy import LazyModule
+
+entry = LazyModule('revelation.entry')
+
+VERSION = 1
+
+## scores kept, the rest is forgotten
+KEEP = 32
+
+## seconds after which a score counts half
+HALF_LIFE = 14 * 24 * 60 * 60
+
+
+def frecency_file(filename):
+    "Returns the name of the file the scores of a data file are kept in"
+    return os.path.join(
+        skeleton.cache_dir(),
+        'frecency-' + hashlib.sha1(filename).hexdigest()
+    )
+
+
+class FrecencyTracker(object):
+    "Scores of the entries of one data file"
+
+    def __init__(self, filename, clock=time.time):
+        self.filename = filename
+        self.clock = clock
+
+        self.salt = None
+        ## score and time of the last activation, by entry key
+        self.scores = {}
+
+        self.__load()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def key(self, names):
+        "Returns the key of the entry with the given names along its path"
+        return hmac.new(self.salt, '\x00'.join(names), hashlib.sha256).hexdigest()
+
+    def score(self, key, now=None):
+        "Returns the current score of an entry"
+
+        if key not in self.scores:
+            return 0.0
+
+        score, last = self.scores[key]
+
+        if now is None:
+            now = self.clock()
+
+        return score * 0.5 ** (max(now - last, 0) / float(HALF_LIFE))
+
+    def record(self, names):
+        "Records an activation of an entry, returns its key"
+        now = self.clock()
+        key = self.key(names)
+
+        self.scores[key] = (self.score(key, now) + 1, now)
+
+        if len(self.scores) > KEEP:
+            for old in self.top()[KEEP:]:
+                del self.scores[old]
+
+        try:
+            self.__save()
+
+        except (IOError, OSError):
+            pass
+
+        return key
+
+    def top(self, count=None):
+        "Returns the keys of the entries with the highest scores, best first"
+        now = self.clock()
+        keys = sorted(self.scores, key=lambda key: -self.score(key, now))
+
+        return count is None and keys or keys[:count]
+
+    def __load(self):
+        try:
+            input = open(frecency_file(self.filename), 'rb')
+
+        except IOError:
+            input = None
+
+        if input is not None:
+            try:
+                stored = json.loads(input.read())
+
+                if stored.get('version') == VERSION:
+                    self.salt = stored['salt'].decode('hex')
+                    self.scores = dict(
+                        (key, (score, last)) for key, (score, last) in stored['scores'].items()
+                    )
+
+            except (AttributeError, KeyError, TypeError, ValueError):
+                self.scores = {}
+
+            finally:
+                input.close()
+
+        if self.salt is None:
+            self.salt = os.urandom(16)
+            self.scores = {}
+
+    def __save(self):
+        stored = {
+            'version': VERSION,
+            'salt': self.salt.encode('hex'),
+            'scores': self.scores,
+        }
+
+        if not os.path.isdir(skeleton.cache_dir()):
+            os.makedirs(skeleton.cache_dir(), 0o700)
+
+        ## written next to the old one and renamed, so readers never see half
+        name = frecency_file(self.filename)
+        output = os.fdopen(os.open(name + '.new', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb')
+
+        try:
+            output.write(json.dumps(stored))
+
+        finally:
+            output.close()
+
+        os.rename(name + '.new', name)
+
+
+def find_paths(tracker, entrystore, keys, parent=None, names=()):
+    """
+    Returns the entrystore paths of the entries below parent with the
+    given keys, by key
+    """
+    paths = {}
+
+    if not keys:
+        return paths
+
+    for i in range(entrystore.iter_n_children(parent)):
+        iter = entrystore.iter_nth_child(parent, i)
+        e = entrystore.get_entry(iter)
+
+        if e.id == entry.FolderEntry.id:
+            paths.update(find_paths(tracker, entrystore, keys, iter, names + (e.name,)))
+            continue
+
+        key = tracker.key(names + (e.name,))
+        if key in keys:
+            paths[key] = entrystore.get_path(iter)
+
+    return paths
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Named timing spans and counters for the hot paths of the indicator.
+
+Nothing is recorded until enable() is called. While disabled, span()
+returns a shared no-op object and count() returns right away, so the
+instrumentation can stay in place permanently.
+
+    with instrument.span('file_load.parse'):
+        ...
+
+    instrument.count('config_get.hit')
+"""
+
+import time
+import threading
+import collections
+
+## number of samples kept per span for the percentiles
+SAMPLES = 1000
+
+enabled = False
+
+spans = {}
+counters = {}
+
+_lock = threading.Lock()
+
+
+class SpanStats(object):
+    "Timings recorded for one span"
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        "Returns the given percentile of the kept samples"
+        samples = sorted(self.samples)
+
+        if not samples:
+            return 0.0
+
+        rank = int(round(percent / 100.0 * len(samples))) - 1
+        return samples[min(max(rank, 0), len(samples) - 1)]
+
+
+class Span(object):
+    "Records the time spent inside a with block"
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, type, value, trace):
+        record(self.name, time.time() - self.started)
+        return False
+
+
+class NoSpan(object):
+    "Stands in for Span while instrumentation is disabled"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, trace):
+        return False
+
+NOSPAN = NoSpan()
+
+
+def enable():
+    "Starts recording spans and counters"
+    global enabled
+    enabled = True
+
+
+def disable():
+    "Stops recording, what was recorded so far is kept"
+    global enabled
+    enabled = False
+
+
+def reset():
+    "Forgets everything recorded so far"
+    with _lock:
+        spans.clear()
+        counters.clear()
+
+
+def span(name):
+    "Returns a context manager that records the time spent in it as name"
+    if not enabled:
+        return NOSPAN
+
+    return Span(name)
+
+
+def record(name, seconds):
+    "Records a duration measured elsewhere"
+    if not enabled:
+        return
+
+    with _lock:
+        if name not in spans:
+            spans[name] = SpanStats()
+
+        spans[name].add(seconds)
+
+
+def count(name, n=1):
+    "Increases the counter name by n"
+    if not enabled:
+        return
+
+    with _lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+def report():
+    "Returns the recorded spans and counters as text"
+    lines = []
+
+    with _lock:
+        lines.append('%-32s %8s %10s %10s %10s' % ('span', 'count', 'p50 ms', 'p95 ms', 'max ms'))
+
+        for name in sorted(spans):
+            stats = spans[name]
+            lines.append('%-32s %8d %10.3f %10.3f %10.3f' % (
+                name,
+                stats.count,
+                stats.percentile(50) * 1000,
+                stats.percentile(95) * 1000,
+                stats.max * 1000
+            ))
+
+        if counters:
+            lines.append('')
+            lines.append('%-32s %8s' % ('counter', 'value'))
+
+            for name in sorted(counters):
+                lines.append('%-32s %8d' % (name, counters[name]))
+
+    return '\n'.join(lines) + '\n'
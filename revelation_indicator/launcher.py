@@ -0,0 +1,176 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Launcher commands of entry types, parsed once and kept until they change.
+
+Revelation keeps a command template per entry type under
+/apps/revelation/launcher, in the syntax of util.parse_subst: %x is
+replaced by the value of the field with symbol x, %?x as well but may be
+empty, and %% is a literal %. Parsing a template again for every entry
+shown makes checking many entries slow, so each one is split into a
+Template once and dropped when the config monitor reports a change.
+"""
+
+from revelation_indicator import secret
+from revelation_indicator.lazy import LazyModule
+
+entry = LazyModule('revelation.entry')
+util = LazyModule('revelation.util')
+
+KEY = '/apps/revelation/launcher/%s'
+
+
+class Template(object):
+    """
+    A parsed launcher command. parts holds literal text as strings and
+    substitutions as (symbol, optional) pairs.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.required = frozenset(
+            part[0] for part in parts if isinstance(part, tuple) and not part[1]
+        )
+
+    def is_valid(self, e):
+        "Checks if e has values for all fields the command requires"
+
+        for field in e.fields:
+            if field.symbol in self.required and field.value in ('', None):
+                return False
+
+        return True
+
+    def expand(self, e):
+        """
+        Returns the command for e, with the values of secrets filled in.
+        Raises SubstValueError if it is not valid for e.
+        """
+
+        if not self.is_valid(e):
+            raise util.SubstValueError
+
+        values = dict((field.symbol, secret.plain(field.value)) for field in e.fields)
+
+        ## don't keep the values around in a traceback
+        try:
+            return ''.join(
+                isinstance(part, tuple) and (values[part[0]] or '') or part
+                for part in self.parts
+            )
+
+        finally:
+            values.clear()
+
+
+def compile(command, symbols):
+    """
+    Parses a launcher command for entries with fields of the given
+    symbols, returns a Template. Raises SubstFormatError like
+    util.parse_subst does for a broken command.
+    """
+    parts = []
+    text = []
+
+    pos = 0
+    while pos < len(command):
+        char = command[pos]
+        pos += 1
+
+        if char != '%':
+            text.append(char)
+            continue
+
+        optional = command[pos:pos + 1] == '?'
+        if optional:
+            pos += 1
+
+        symbol = command[pos:pos + 1]
+        pos += 1
+
+        if symbol == '%' and not optional:
+            text.append('%')
+
+        elif symbol and symbol in symbols:
+            if text:
+                parts.append(''.join(text))
+                text = []
+
+            parts.append((symbol, optional))
+
+        else:
+            raise util.SubstFormatError
+
+    if text:
+        parts.append(''.join(text))
+
+    return Template(parts)
+
+
+class LauncherCache(object):
+    "Templates of the launcher commands by entry type, compiled on first use"
+
+    def __init__(self, config):
+        self.config = config
+        self.templates = {}
+        self.monitored = set()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def get(self, id):
+        """
+        Returns the Template for entries of type id, or None if the type
+        has no launcher. Raises SubstFormatError if its command is broken.
+        """
+
+        if id not in self.templates:
+            ## before reading the command, monitors report the current value
+            if id not in self.monitored:
+                self.config.monitor(KEY % id, self.__cb_changed, id)
+                self.monitored.add(id)
+
+            self.templates[id] = self.__compile(id)
+
+        template = self.templates[id]
+
+        if isinstance(template, Exception):
+            raise template
+
+        return template
+
+    def clear(self):
+        "Drops all compiled templates"
+        self.templates.clear()
+
+    def __compile(self, id):
+        command = self.config.get(KEY % id)
+
+        if command in ('', None) or id not in entry.ENTRYLIST:
+            return None
+
+        symbols = set(field.symbol for field in entry.ENTRYLIST[id]().fields)
+
+        try:
+            return compile(command, symbols)
+
+        except util.SubstFormatError:
+            return util.SubstFormatError()
+
+    def __cb_changed(self, key, value, id):
+        "Config monitor callback, drops the template of a changed command"
+        self.templates.pop(id, None)
@@ -0,0 +1,45 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import time
+
+## (module name, seconds) for every deferred import done so far
+import_times = []
+
+
+class LazyModule(object):
+    """
+    Stands in for a module that is only imported once one of its
+    attributes is used. This keeps modules that are not needed to show
+    the indicator out of the startup path.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr):
+        if self.__module is None:
+            start = time.time()
+
+            __import__(self.__name)
+            self.__module = sys.modules[self.__name]
+
+            import_times.append((self.__name, time.time() - start))
+
+        return getattr(self.__module, attr)
@@ -0,0 +1,539 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import mmap
+import hashlib
+import threading
+
+import gobject
+
+import logging
+logger = logging.getLogger(__file__)
+
+from revelation_indicator import instrument, profiler, rvl, skeleton
+from revelation_indicator.lazy import LazyModule
+
+datahandler = LazyModule('revelation.datahandler')
+io = LazyModule('revelation.io')
+
+
+## milliseconds between attempts to start a reload while the worker is busy
+RELOAD_RETRY = 500
+
+
+class FileUnchanged(Exception):
+    """
+    Raised when a file is reloaded but its contents did not change, with
+    the modification time and size it was read with
+    """
+
+    def __init__(self, stat=None):
+        Exception.__init__(self)
+        self.stat = stat
+
+
+class LoadResult(object):
+    "What the worker hands back to the main loop for a loaded file"
+
+    def __init__(self, filename, handler, entrystore, stat=None, digest=None):
+        self.filename = filename
+        self.handler = handler
+        self.entrystore = entrystore
+        self.stat = stat
+        self.digest = digest
+
+        ## return value of the prepare function passed to FileLoader.load
+        self.prepared = None
+
+
+class Probe(object):
+    """
+    The start of a data file, read before the whole file is. For files
+    known to the rvl module it holds the parsed header and the data
+    handler, otherwise only the data. contents holds the whole file if it
+    was read ahead, see FileLoader.prewarm.
+    """
+
+    def __init__(self, filename, stat, data, handler=None, header=None, contents=None):
+        self.filename = filename
+        self.stat = stat
+        self.data = data
+        self.handler = handler
+        self.header = header
+        self.contents = contents
+
+    def is_current(self, filename):
+        "Checks if the probe is of filename, as it is now"
+        return (
+            self.filename == io.file_normpath(filename) and
+            self.stat is not None and self.stat == file_stat(self.filename)
+        )
+
+
+def file_stat(filename):
+    "Returns the modification time and size of a file, or None"
+    try:
+        stat = os.stat(filename)
+
+    except OSError:
+        return None
+
+    return stat.st_mtime, stat.st_size
+
+
+def probe_file(filename, contents=False):
+    """
+    Reads the start of a data file and detects its format and version
+    from it. Raises the same errors as the format checks of load_file,
+    returns a Probe. With contents, the whole file is read and kept in
+    the probe, so loading the file does not have to read it again.
+    """
+    filename = io.file_normpath(filename)
+
+    with instrument.span('file_load.probe'):
+        stat = file_stat(filename)
+
+        input = open(filename, 'rb')
+        try:
+            data = input.read(contents and -1 or rvl.PROBE_SIZE)
+        finally:
+            input.close()
+
+        contents, data = contents and data or None, data[:rvl.PROBE_SIZE]
+
+        header = rvl.parse_header(data)
+        if header is None:
+            return Probe(filename, stat, data, contents=contents)
+
+        handler = datahandler.detect_handler(data)()
+        handler.check(data)
+
+    return Probe(filename, stat, data, handler, header, contents)
+
+
+def check_password(probe, password, keycache=None):
+    """
+    Derives the key of a probed file and checks it against the start of
+    the file. Returns the key, or None if the file can not be checked
+    here. Raises PasswordError if the password is wrong.
+    """
+    if probe.header is None or password is None or not rvl.supports(probe.handler):
+        return None
+
+    key = keycache is not None and keycache.get(probe.filename, probe.header) or None
+    instrument.count(key is None and 'keycache.miss' or 'keycache.hit')
+
+    if key is None:
+        with instrument.span('file_load.derive_key'):
+            key = rvl.derive_key(probe.header, password)
+
+    with instrument.span('file_load.check_key'):
+        rvl.check_key(probe.header, key, probe.data)
+
+    return key
+
+
+def stream_file(probe, key, digest=None):
+    """
+    Loads a probed file like load_file, but maps it into memory instead of
+    reading it and decrypts, decompresses and parses it in blocks, so the
+    whole plaintext document is never held in memory at once. key is the
+    key returned by check_password. Returns None if the file changed since
+    it was probed. A file that was read ahead is decrypted from memory.
+    """
+    if probe.contents is not None:
+        stat, data = probe.stat, probe.contents
+
+    else:
+        input = open(probe.filename, 'rb')
+
+        try:
+            stat = file_stat(probe.filename)
+            data = mmap.mmap(input.fileno(), 0, access=mmap.ACCESS_READ)
+
+        finally:
+            input.close()
+
+    try:
+        if data[:probe.header.offset] != probe.data[:probe.header.offset]:
+            return None
+
+        newdigest = hashlib.sha1()
+        for start in range(0, len(data), rvl.STREAM_BLOCK_SIZE):
+            newdigest.update(data[start:start + rvl.STREAM_BLOCK_SIZE])
+
+        newdigest = newdigest.hexdigest()
+        if digest is not None and newdigest == digest:
+            raise FileUnchanged(stat)
+
+        with instrument.span('file_load.stream'):
+            entrystore = rvl.parse_stream(rvl.decrypt_stream(probe.header, key, data))
+
+    finally:
+        if data is not probe.contents:
+            data.close()
+
+    return LoadResult(probe.filename, probe.handler.__class__, entrystore, stat, newdigest)
+
+
+def load_file(filename, password, digest=None, keycache=None, probe=None, stream=False):
+    """
+    Reads, decrypts and parses a data file. This is the expensive part of
+    io.DataFile.load, without touching the DataFile itself, so it can be
+    run outside the main loop. Returns a LoadResult.
+
+    If digest is given and matches the digest of the file contents,
+    FileUnchanged is raised instead of decrypting the file again. If a
+    keycache is given, derived keys are taken from and added to it.
+
+    The password is checked against the start of the file before all of
+    it is read, using probe if it is current or a new probe otherwise. If
+    the probe holds the contents of the file, it is not read again. With
+    stream, files known to the rvl module are loaded by stream_file.
+    """
+    filename = io.file_normpath(filename)
+
+    if probe is None or not probe.is_current(filename):
+        probe = probe_file(filename)
+
+    key = check_password(probe, password, keycache)
+
+    if stream and key is not None:
+        result = stream_file(probe, key, digest)
+
+        if result is not None:
+            if keycache is not None:
+                keycache.put(filename, probe.header, key)
+
+            return result
+
+        key = None
+
+    if probe.contents is not None:
+        stat, data = probe.stat, probe.contents
+
+    else:
+        with instrument.span('file_load.read'):
+            stat = file_stat(filename)
+            data = io.file_read(filename)
+
+    ## the file was replaced after it was probed
+    if key is not None and data[:probe.header.offset] != probe.data[:probe.header.offset]:
+        key = None
+
+    newdigest = hashlib.sha1(data).hexdigest()
+    if digest is not None and newdigest == digest:
+        raise FileUnchanged(stat)
+
+    with instrument.span('file_load.check'):
+        handler = datahandler.detect_handler(data)()
+        handler.check(data)
+
+    return LoadResult(
+        filename,
+        handler.__class__,
+        import_data(handler, data, password, filename, keycache, key),
+        stat,
+        newdigest
+    )
+
+
+def import_data(handler, data, password, filename=None, keycache=None, key=None):
+    """
+    Decrypts and parses data with handler, in separate steps for the
+    formats known to the rvl module. key is the key checked by
+    check_password, if any.
+    """
+    header = rvl.parse_header(data)
+
+    if header is None or password is None or not rvl.supports(handler):
+        with instrument.span('file_load.import_data'):
+            return handler.import_data(data, password)
+
+    if key is None and keycache is not None:
+        key = keycache.get(filename, header)
+
+    if key is None:
+        with instrument.span('file_load.derive_key'):
+            key = rvl.derive_key(header, password)
+
+    ## the key is derived like the handlers do, so a wrong one is final
+    with instrument.span('file_load.decrypt'):
+        xml = rvl.decrypt(header, key, data)
+
+    ## only keys that decrypted the file are worth keeping
+    if keycache is not None:
+        keycache.put(filename, header, key)
+
+    with instrument.span('file_load.parse'):
+        return rvl.parse(handler, xml)
+
+
+def load_skeleton(probe, password, keycache=None):
+    """
+    Checks the password of a probed file and returns the CompactEntryStore
+    of its cached skeleton, or None if there is no current one.
+    """
+    key = check_password(probe, password, keycache)
+
+    if key is None:
+        return None
+
+    with instrument.span('file_load.skeleton'):
+        entrystore = skeleton.load(probe.filename, probe.stat, key)
+
+    ## a key that decrypted the skeleton is the key of the file
+    if entrystore is not None and keycache is not None:
+        keycache.put(probe.filename, probe.header, key)
+
+    return entrystore
+
+
+def save_skeleton(probe, result, keycache):
+    "Saves the skeleton of a loaded file, if its key is known"
+
+    if probe.header is None or probe.stat != result.stat:
+        return
+
+    key = keycache.get(result.filename, probe.header)
+
+    if key is None:
+        return
+
+    try:
+        skeleton.save(result.filename, result.stat, result.digest, key, result.entrystore)
+
+    except (IOError, OSError):
+        logger.warning('unable to save the skeleton of %s', result.filename)
+
+
+class FileLoader(object):
+    "Runs load_file in a worker thread and reports back on the main loop"
+
+    def __init__(self, keycache=None):
+        self.thread = None
+        self.keycache = keycache
+
+        ## the last file probed, kept for retries after a wrong password
+        self.probe = None
+
+        ## whether to load files with stream_file
+        self.stream = False
+
+        ## whether to keep skeletons of loaded files, see load_skeleton
+        self.skeletons = False
+
+        ## the thread reading a file ahead, see prewarm
+        self.prewarm_thread = None
+
+    def is_busy(self):
+        "Checks if a load is currently running"
+        return self.thread is not None
+
+    def load(self, filename, password, callback, errback, prepare=None, digest=None, paint=None, profile=None):
+        """
+        Starts loading filename in the background. Once done, either
+        callback is called with the LoadResult or errback with the raised
+        exception, both from the main loop. If given, prepare is called
+        with the loaded entrystore in the worker as well, and its return
+        value is stored in the result. For digest, see load_file.
+
+        If skeletons are enabled and paint is given, it is called from the
+        main loop with the cached skeleton of the file, before callback.
+        With the token of a profiler session as profile, the load is
+        profiled and the session finished once the callback returned.
+        """
+        if self.is_busy():
+            logger.debug('load already running, ignoring %s', filename)
+            return False
+
+        self.thread = threading.Thread(
+            target=self.__run,
+            args=(filename, password, callback, errback, prepare, digest, paint, profile)
+        )
+        self.thread.daemon = True
+        self.thread.start()
+
+        return True
+
+    def prewarm(self, filename):
+        """
+        Reads and probes filename in the background, keeping its contents
+        in memory, so unlocking it later only has to derive the key and
+        decrypt. Nothing secret is involved, and errors are left for the
+        load to report.
+        """
+        self.prewarm_thread = threading.Thread(target=self.__prewarm, args=(filename,))
+        self.prewarm_thread.daemon = True
+        self.prewarm_thread.start()
+
+    def __prewarm(self, filename):
+        try:
+            with instrument.span('file_load.prewarm'):
+                self.probe = probe_file(filename, contents=True)
+
+        except Exception:
+            logger.debug('unable to read %s ahead', filename)
+
+    def __run(self, filename, password, callback, errback, prepare, digest, paint, profile):
+        with profiler.profile_thread(profile):
+            self.__load(filename, password, callback, errback, prepare, digest, paint, profile)
+
+    def __load(self, filename, password, callback, errback, prepare, digest, paint, profile):
+        try:
+            ## a file still being read ahead is not read a second time
+            prewarm_thread = self.prewarm_thread
+            if prewarm_thread is not None:
+                prewarm_thread.join()
+                self.prewarm_thread = None
+
+            if self.probe is None or not self.probe.is_current(filename):
+                self.probe = probe_file(filename)
+
+            if self.skeletons and paint is not None:
+                entrystore = load_skeleton(self.probe, password, self.keycache)
+
+                if entrystore is not None:
+                    gobject.idle_add(self.__paint, paint, entrystore)
+
+            result = load_file(
+                filename, password, digest, self.keycache, self.probe, self.stream
+            )
+
+            if self.skeletons and self.keycache is not None:
+                save_skeleton(self.probe, result, self.keycache)
+
+            if prepare is not None:
+                result.prepared = prepare(result.entrystore)
+
+        except Exception:
+            gobject.idle_add(self.__finish, errback, sys.exc_info()[1], profile)
+
+        else:
+            gobject.idle_add(self.__finish, callback, result, profile)
+
+    def __paint(self, paint, entrystore):
+        paint(entrystore)
+
+        return False
+
+    def __finish(self, callback, result, profile):
+        self.thread = None
+        callback(result)
+
+        ## the profile of a load includes handling its result
+        profiler.finish(profile)
+
+        return False
+
+
+class ReloadScheduler(object):
+    """
+    Turns bursts of change notifications for a file into a single reload.
+    The reload starts once no notification came in for the given delay,
+    and only one reload runs at a time; notifications that come in while
+    it runs lead to one more reload afterwards. Reloads are skipped if the
+    modification time and size of the file are the same as last time.
+
+    reload is called to start a reload and returns False if it could not
+    be started. Once the reload is done, finished() has to be called.
+    """
+
+    def __init__(self, reload):
+        self.reload = reload
+
+        self.delay = 0
+        self.timeout = None
+        self.running = False
+        self.pending = False
+
+        ## state of the file as of the last load
+        self.filename = None
+        self.stat = None
+        self.digest = None
+
+    def loaded(self, result):
+        "Remembers the state of a file that was just loaded"
+        self.filename = result.filename
+        self.stat = result.stat
+        self.digest = result.digest
+
+    def schedule(self, delay):
+        "Schedules a reload after delay milliseconds without notifications"
+        self.delay = delay
+
+        if self.timeout is not None:
+            gobject.source_remove(self.timeout)
+            instrument.count('reload.coalesced')
+
+        self.timeout = gobject.timeout_add(delay, self.__cb_timeout)
+
+    def cancel(self):
+        "Cancels all scheduled reloads and forgets the file"
+
+        if self.timeout is not None:
+            gobject.source_remove(self.timeout)
+            self.timeout = None
+
+        self.running = False
+        self.pending = False
+
+        self.filename = None
+        self.stat = None
+        self.digest = None
+
+    def finished(self, result=None, stat=None):
+        """
+        Called when a reload is done, with its LoadResult if it loaded, or
+        with the stat of the file if its contents did not change
+        """
+        self.running = False
+
+        if result is not None:
+            self.loaded(result)
+
+        elif stat is not None:
+            self.stat = stat
+
+        if self.pending:
+            self.pending = False
+            self.__start()
+
+    def __cb_timeout(self):
+        self.timeout = None
+        self.__start()
+
+        return False
+
+    def __start(self):
+        if self.running:
+            self.pending = True
+            return
+
+        if self.stat is not None and file_stat(self.filename) == self.stat:
+            logger.debug('%s did not change, skipping reload', self.filename)
+            instrument.count('reload.skipped')
+            return
+
+        self.running = self.reload()
+
+        ## the worker is busy with something else, try again later, but
+        ## not right away with a delay of 0, which would spin the main loop
+        if not self.running:
+            self.timeout = gobject.timeout_add(max(self.delay, RELOAD_RETRY), self.__cb_timeout)
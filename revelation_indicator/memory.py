@@ -0,0 +1,45 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+def _read_status(field):
+    "Returns a field of /proc/self/status in bytes, or None if unknown"
+    try:
+        status = open('/proc/self/status')
+
+    except IOError:
+        return None
+
+    try:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+
+    finally:
+        status.close()
+
+    return None
+
+
+def resident_memory():
+    "Returns the current resident set size of the process in bytes"
+    return _read_status('VmRSS')
+
+
+def peak_resident_memory():
+    "Returns the peak resident set size of the process in bytes"
+    return _read_status('VmHWM')
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import gobject
+
+from revelation_indicator import instrument
+
+
+class MenuBuilder(object):
+    """
+    Fills a menu with items in chunks of CHUNK_SIZE from an idle handler,
+    so building the menu of a large folder does not block the main loop.
+    The first chunk is added right away, so small menus are complete as
+    soon as the builder is created.
+
+    create is called with the index of each item to add and returns the
+    item, which is expected to be shown already.
+    """
+
+    CHUNK_SIZE = 100
+
+    def __init__(self, menu, count, create):
+        self.menu = menu
+        self.count = count
+        self.create = create
+
+        self.added = 0
+        self.source = None
+
+        self.__add(self.CHUNK_SIZE)
+
+        if not self.is_done():
+            self.source = gobject.idle_add(self.__cb_idle)
+
+    def is_done(self):
+        "Checks if all items were added"
+        return self.added >= self.count
+
+    def finish(self):
+        "Adds all remaining items right away"
+        self.cancel()
+        self.__add(self.count - self.added)
+
+    def cancel(self):
+        "Stops adding items"
+
+        if self.source is not None:
+            gobject.source_remove(self.source)
+            self.source = None
+
+    def __add(self, count):
+        with instrument.span('menu_builder.chunk'):
+            for i in range(self.added, min(self.added + count, self.count)):
+                self.menu.append(self.create(i))
+                self.added += 1
+
+    def __cb_idle(self):
+        self.__add(self.CHUNK_SIZE)
+
+        if self.is_done():
+            self.source = None
+            return False
+
+        return True
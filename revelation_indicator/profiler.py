@@ -0,0 +1,274 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Profiles of a single unlock or reload, for reports of slow sessions.
+
+Once arm() was called, the next unlock or reload runs under cProfile,
+in the main loop as well as in the worker thread, and allocations are
+traced with tracemalloc where it is available (Python 3.4 or the
+pytracemalloc backport). start() returns a token for the load, which is
+handed to the worker and to finish(); other loads running meanwhile are
+neither profiled nor end the session. When the load is done, the
+functions sorted by cumulative time and the top allocation sites are
+written to a file in the cache directory.
+
+Only what cProfile and tracemalloc record ends up in the file: function
+names, file names, line numbers, timings and sizes. Neither records
+values or arguments, so no secret ever does.
+
+    token = profiler.start('file_open')
+    ...
+    with profiler.profile_thread(token):
+        ...
+    profiler.finish(token)
+"""
+
+import os
+import time
+import pstats
+import cProfile
+import threading
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import logging
+logger = logging.getLogger(__file__)
+
+from revelation_indicator import skeleton
+
+## functions and allocation sites written
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 30
+
+## seconds to wait for worker threads to finish their profiles
+THREAD_TIMEOUT = 10
+
+armed = False
+
+_session = None
+_lock = threading.Lock()
+
+
+class Session(object):
+    "The profiles taken for one load, its token"
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+
+        self.main = cProfile.Profile()
+        ## profiles of the worker threads, added once each is done
+        self.profiles = []
+        self.threads = 0
+        self.done = threading.Condition()
+
+        self.tracing = False
+
+    def wait(self, timeout):
+        "Waits until all worker threads added their profiles, returns if they did"
+        deadline = time.time() + timeout
+
+        with self.done:
+            while self.threads > 0:
+                remaining = deadline - time.time()
+
+                if remaining <= 0:
+                    return False
+
+                self.done.wait(remaining)
+
+        return True
+
+
+class NoProfile(object):
+    "Stands in for a thread profile while nothing is profiled"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, trace):
+        return False
+
+NOPROFILE = NoProfile()
+
+
+class ThreadProfile(object):
+    "Profiles a with block in a worker thread as part of a session"
+
+    def __init__(self, session):
+        self.session = session
+        self.profile = cProfile.Profile()
+
+        with session.done:
+            session.threads += 1
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, type, value, trace):
+        self.profile.disable()
+
+        with self.session.done:
+            self.session.profiles.append(self.profile)
+            self.session.threads -= 1
+            self.session.done.notify_all()
+
+        return False
+
+
+def arm():
+    "Makes the next unlock or reload be profiled"
+    global armed
+    armed = True
+
+
+def is_running():
+    "Checks if a load is being profiled"
+    return _session is not None
+
+
+def start(name):
+    """
+    Starts profiling a load named name, if armed and none is running.
+    Returns the token of the session, or None if it did not start one.
+    """
+    global armed, _session
+
+    with _lock:
+        if not armed or _session is not None:
+            return None
+
+        armed = False
+        session = _session = Session(name)
+
+    if tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        session.tracing = True
+
+    session.main.enable()
+
+    logger.debug('profiling %s', name)
+
+    return session
+
+
+def profile_thread(token):
+    """
+    Returns a context manager that profiles the with block as part of
+    the session of token, for code running in a worker thread
+    """
+    session = _session
+
+    if token is None or token is not session:
+        return NOPROFILE
+
+    return ThreadProfile(session)
+
+
+def finish(token):
+    """
+    Ends the session of token and writes its report, once the worker
+    threads are done with their profiles. Returns the file name of the
+    report, or None if token is not the running session.
+    """
+    global _session
+
+    with _lock:
+        if token is None or token is not _session:
+            return None
+
+        session, _session = _session, None
+
+    session.main.disable()
+
+    if not session.wait(THREAD_TIMEOUT):
+        logger.warning('profile of %s is missing unfinished threads', session.name)
+
+    snapshot = None
+    if session.tracing:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    try:
+        filename = write_report(session, snapshot)
+
+    except (IOError, OSError):
+        logger.warning('unable to write the profile of %s', session.name)
+        return None
+
+    logger.info('profile of %s written to %s', session.name, filename)
+
+    return filename
+
+
+def report(session, snapshot=None):
+    "Returns the report of a session as text"
+    output = StringIO()
+
+    output.write('profile of %s, %.3f seconds\n\n' % (
+        session.name, time.time() - session.started
+    ))
+
+    stats = pstats.Stats(session.main, stream=output)
+
+    with session.done:
+        for profile in session.profiles:
+            stats.add(profile)
+
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+    if snapshot is not None:
+        output.write('top allocation sites:\n\n')
+
+        for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            output.write('%s\n' % statistic)
+
+    else:
+        output.write('allocations were not traced, tracemalloc is not available\n')
+
+    return output.getvalue()
+
+
+def write_report(session, snapshot=None):
+    "Writes the report of a session to the cache directory, returns its name"
+    directory = skeleton.cache_dir()
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+
+    filename = os.path.join(directory, 'profile-%s-%s.txt' % (
+        session.name, time.strftime('%Y%m%d-%H%M%S', time.localtime(session.started))
+    ))
+
+    output = os.fdopen(os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w')
+
+    try:
+        output.write(report(session, snapshot))
+
+    finally:
+        output.close()
+
+    return filename
@@ -0,0 +1,426 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Staged decoding of Revelation (rvl) data files.
+
+The Revelation data handlers derive the key, decrypt, check and parse a
+file in a single import_data call. This module does the same in separate
+steps, so each of them can be timed, cached or skipped on its own. Files
+in any other format are left to their data handler.
+"""
+
+import zlib
+import threading
+import xml.parsers.expat
+
+from revelation_indicator.lazy import LazyModule
+
+data = LazyModule('revelation.data')
+datahandler = LazyModule('revelation.datahandler')
+entry = LazyModule('revelation.entry')
+AES = LazyModule('Crypto.Cipher.AES')
+SHA256 = LazyModule('Crypto.Hash.SHA256')
+KDF = LazyModule('Crypto.Protocol.KDF')
+
+MAGIC = 'rvl\x00'
+HEADER_SIZE = 12
+
+## key derivation of data version 2 files, as done by Revelation
+V2_SALT_SIZE = 8
+V2_ITERATIONS = 12000
+
+## bytes read to probe a file: its header and the first blocks of payload
+PROBE_SIZE = 96
+
+## bytes decrypted at a time when streaming a file
+STREAM_BLOCK_SIZE = 65536
+
+## data handlers whose files can be decoded here
+HANDLERS = ('Revelation', 'Revelation2')
+
+
+class Header(object):
+    "What is needed from the start of a data file to derive its key"
+
+    def __init__(self, dataversion, iv, offset, salt=None, iterations=None):
+        self.dataversion = dataversion
+        self.iv = iv
+        self.offset = offset
+        self.salt = salt
+        self.iterations = iterations
+
+    def key_params(self):
+        "Returns everything the derived key depends on, except the password"
+        return (self.dataversion, self.salt, self.iterations)
+
+
+class KeyCache(object):
+    """
+    Derived keys of the open file, so reloads of the same file do not have
+    to run the key derivation again. Keys are looked up by file name and
+    everything the derivation depends on besides the password, so a cache
+    must only ever be used with a single password. Keys are kept in
+    bytearrays, which clear() overwrites with zeros before dropping them.
+
+    Revelation writes a new random salt on every save, and the key depends
+    on it, so a reload after the file was saved always derives again. Only
+    reloads of a file whose salt is unchanged are served from the cache,
+    e.g. the reload of a touched or restored file, or the load of the full
+    file after its skeleton. The cache is cleared whenever a file is
+    unlocked or locked, so unlocking again derives the key again as well.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, filename, header):
+        "Returns the cached key for a file, or None"
+        with self.lock:
+            key = self.keys.get((filename, header.key_params()))
+
+            return key is not None and bytes(key) or None
+
+    def put(self, filename, header, key):
+        "Caches the key of a file"
+        with self.lock:
+            self.keys[(filename, header.key_params())] = bytearray(key)
+
+    def clear(self):
+        "Overwrites and forgets all cached keys"
+        with self.lock:
+            for key in self.keys.values():
+                key[:] = b'\x00' * len(key)
+
+            self.keys.clear()
+
+
+def supports(handler):
+    "Checks if files of a data handler can be decoded here"
+    return handler.__class__.__name__ in HANDLERS
+
+
+def parse_header(data):
+    "Parses the header at the start of data, returns None if unknown"
+
+    if len(data) < HEADER_SIZE or data[0:4] != MAGIC:
+        return None
+
+    dataversion = ord(data[4])
+
+    if dataversion == 1 and len(data) >= HEADER_SIZE + 16:
+        return Header(1, data[12:28], 28)
+
+    if dataversion == 2 and len(data) >= HEADER_SIZE + V2_SALT_SIZE + 16:
+        return Header(2, data[20:36], 36, data[12:20], V2_ITERATIONS)
+
+    return None
+
+
+def derive_key(header, password):
+    "Derives the AES key of a file from its password"
+
+    if header.dataversion == 1:
+        password = password[:32]
+        return password + '\x00' * (32 - len(password))
+
+    return KDF.PBKDF2(password, header.salt, 32, header.iterations)
+
+
+def check_key(header, key, data):
+    """
+    Checks a key against the start of a file, without decrypting all of
+    it. The payload of both versions is zlib compressed, so the first
+    decrypted block of the compressed data has to start with a valid zlib
+    header. Raises PasswordError if it does not. A wrong key passes this
+    check once in a few hundred tries, decrypt() catches those.
+    """
+
+    if header.dataversion == 1:
+        ## the first payload block, which starts the compressed data
+        if len(data) < header.offset + 16:
+            return
+
+        iv = AES.new(key, AES.MODE_ECB).decrypt(header.iv)
+        block = AES.new(key, AES.MODE_CBC, iv).decrypt(data[header.offset:header.offset + 16])
+
+    else:
+        ## the third payload block, after the SHA256 digest
+        if len(data) < header.offset + 48:
+            return
+
+        block = AES.new(key, AES.MODE_CBC, data[header.offset + 16:header.offset + 32]).decrypt(
+            data[header.offset + 32:header.offset + 48]
+        )
+
+    cmf, flg = ord(block[0]), ord(block[1])
+
+    if cmf & 0x0f != 8 or cmf >> 4 > 7 or (cmf * 256 + flg) % 31 != 0:
+        raise datahandler.PasswordError
+
+
+def unpad(data):
+    "Removes the padding from decrypted data, raises PasswordError if invalid"
+
+    if not data:
+        raise datahandler.PasswordError
+
+    padlen = ord(data[-1])
+
+    if padlen < 1 or padlen > 16 or data[-padlen:] != data[-1] * padlen:
+        raise datahandler.PasswordError
+
+    return data[:-padlen]
+
+
+def decrypt(header, key, data):
+    """
+    Decrypts the payload of a file and checks it. Returns the XML
+    document, raises PasswordError if the key is wrong.
+    """
+
+    if header.dataversion == 1:
+        iv = AES.new(key, AES.MODE_ECB).decrypt(header.iv)
+        plaintext = AES.new(key, AES.MODE_CBC, iv).decrypt(data[header.offset:])
+        plaintext = unpad(plaintext)
+
+    else:
+        plaintext = AES.new(key, AES.MODE_CBC, header.iv).decrypt(data[header.offset:])
+        digest, plaintext = plaintext[:32], plaintext[32:]
+
+        if SHA256.new(plaintext).digest() != digest:
+            raise datahandler.PasswordError
+
+        plaintext = unpad(plaintext)
+
+    try:
+        return zlib.decompress(plaintext)
+
+    except zlib.error:
+        raise datahandler.PasswordError
+
+
+def decrypt_stream(header, key, data, blocksize=STREAM_BLOCK_SIZE):
+    """
+    Decrypts the payload of a file blocksize bytes at a time, yielding the
+    XML document in pieces as it is decompressed. data only has to
+    support len() and slicing, so it can be an mmap of the file. Raises
+    PasswordError like decrypt(); for version 2 files the digest can only
+    be checked once the whole document has been yielded.
+    """
+    size = len(data) - header.offset
+
+    if size < (header.dataversion == 1 and 16 or 48) or size % 16:
+        raise datahandler.FormatError
+
+    if header.dataversion == 1:
+        iv = AES.new(key, AES.MODE_ECB).decrypt(header.iv)
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+        digest = None
+
+    else:
+        cipher = AES.new(key, AES.MODE_CBC, header.iv)
+        digest = SHA256.new()
+
+    decompressor = zlib.decompressobj()
+    blocksize = max(blocksize - blocksize % 16, 48)
+
+    expected = None
+    pending = ''
+
+    for start in range(header.offset, len(data), blocksize):
+        plaintext = pending + cipher.decrypt(data[start:start + blocksize])
+
+        if digest is not None and expected is None:
+            expected, plaintext = plaintext[:32], plaintext[32:]
+
+        ## the last block is held back until it is known to hold the padding
+        plaintext, pending = plaintext[:-16], plaintext[-16:]
+
+        if digest is not None:
+            digest.update(plaintext)
+
+        yield _decompress(decompressor, plaintext)
+
+    if digest is not None:
+        digest.update(pending)
+
+    plaintext = _decompress(decompressor, unpad(pending))
+
+    ## version 1 files have nothing but the zlib stream to check
+    if not _finished(decompressor):
+        raise datahandler.PasswordError
+
+    yield plaintext + decompressor.flush()
+
+    if digest is not None and digest.digest() != expected:
+        raise datahandler.PasswordError
+
+
+def _decompress(decompressor, data):
+    try:
+        return decompressor.decompress(data)
+
+    except zlib.error:
+        raise datahandler.PasswordError
+
+
+def _finished(decompressor):
+    "Checks that the compressed data ended exactly where its stream did"
+
+    if hasattr(decompressor, 'eof'):
+        return decompressor.eof and not decompressor.unused_data
+
+    ## older zlib modules only tell by where data after the end goes
+    try:
+        decompressor.decompress(b'\x00')
+
+    except zlib.error:
+        return False
+
+    return decompressor.unused_data == b'\x00'
+
+
+class StreamParser(object):
+    """
+    Builds an entrystore from a Revelation XML document that is fed in
+    pieces. Entries are added to the entrystore as soon as their element
+    starts and filled in as their child elements arrive, the same way the
+    Revelation data handlers import a whole document.
+    """
+
+    ## child elements of an entry holding text
+    TEXT = ('name', 'description', 'notes', 'updated', 'field')
+
+    def __init__(self):
+        self.entrystore = data.EntryStore()
+        self.entries = []
+        self.started = False
+
+        self.text = None
+        self.field = None
+
+        self.parser = xml.parsers.expat.ParserCreate()
+
+        ## Revelation keeps text as UTF-8 encoded strings
+        if hasattr(self.parser, 'returns_unicode'):
+            self.parser.returns_unicode = False
+
+        self.parser.StartElementHandler = self.__start
+        self.parser.EndElementHandler = self.__end
+        self.parser.CharacterDataHandler = self.__text
+
+    def feed(self, chunk, final=False):
+        "Parses the next piece of the document"
+        try:
+            self.parser.Parse(chunk, final)
+
+        except xml.parsers.expat.ExpatError:
+            raise datahandler.FormatError
+
+        except (entry.EntryTypeError, entry.EntryFieldError, ValueError):
+            raise datahandler.DataError
+
+    def close(self):
+        "Ends the document and returns the entrystore"
+        self.feed('', True)
+
+        if not self.started or self.entries:
+            raise datahandler.FormatError
+
+        return self.entrystore
+
+    def __start(self, name, attrs):
+        if not self.started:
+            if name != 'revelationdata' or 'dataversion' not in attrs:
+                raise datahandler.FormatError
+
+            self.started = True
+
+        elif self.text is not None:
+            raise datahandler.FormatError
+
+        elif name == 'entry':
+            parent = None
+
+            if self.entries:
+                e, parent = self.entries[-1]
+
+                if type(e) != entry.FolderEntry:
+                    raise datahandler.DataError
+
+            try:
+                e = entry.ENTRYLIST[attrs['type']]()
+
+            except KeyError:
+                raise datahandler.DataError
+
+            self.entries.append((e, self.entrystore.add_entry(e, parent)))
+
+        elif name in self.TEXT and self.entries:
+            self.text = []
+            self.field = attrs.get('id')
+
+        else:
+            raise datahandler.FormatError
+
+    def __end(self, name):
+        if name == 'entry':
+            e, iter = self.entries.pop()
+            self.entrystore.update_entry(iter, e)
+
+        elif self.text is not None:
+            e = self.entries[-1][0]
+            text, self.text = ''.join(self.text), None
+
+            if name == 'field':
+                try:
+                    e[entry.FIELDLIST[self.field]] = text
+
+                except KeyError:
+                    raise datahandler.DataError
+
+            elif name == 'updated':
+                e.updated = int(text)
+
+            else:
+                setattr(e, name, text)
+
+    def __text(self, text):
+        if self.text is not None:
+            self.text.append(text)
+
+
+def parse_stream(chunks):
+    "Parses an XML document yielded in pieces by chunks into an entrystore"
+
+    parser = StreamParser()
+
+    for chunk in chunks:
+        parser.feed(chunk)
+
+    return parser.close()
+
+
+def parse(handler, xml):
+    "Parses a decrypted XML document into an entrystore"
+
+    ## the rvl handlers are RevelationXML handlers with encryption on top
+    return datahandler.RevelationXML.import_data(handler, xml)
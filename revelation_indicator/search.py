@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import heapq
+import bisect
+
+from revelation_indicator.lazy import LazyModule
+
+entry = LazyModule('revelation.entry')
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase words. Byte strings, as returned by gtk and
+    revelation, are decoded as UTF-8 first, so that words with non-ASCII
+    letters are split and lowercased correctly.
+    """
+    if not text:
+        return []
+
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', 'replace')
+
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex(object):
+    """
+    Word prefix index over the entries of an entrystore. Entries are found
+    by their name, description and all fields that are not secret. Every
+    word of a query has to be a prefix of a word of the entry.
+
+    Words are kept in a sorted list, so all words with a given prefix are
+    found with a binary search followed by a short scan.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def clear(self):
+        "Removes everything from the index"
+        self.documents = []
+        self.words = []
+        self.postings = {}
+
+    def update(self, other):
+        """
+        Replaces the contents of the index with those of other, so that
+        whoever holds on to this index sees the new entries
+        """
+        self.documents = other.documents
+        self.words = other.words
+        self.postings = other.postings
+
+    def build(self, entrystore, parent=None):
+        "Adds all entries below parent in entrystore to the index"
+
+        for i in range(entrystore.iter_n_children(parent)):
+            iter = entrystore.iter_nth_child(parent, i)
+            e = entrystore.get_entry(iter)
+
+            if type(e) == entry.FolderEntry:
+                self.build(entrystore, iter)
+
+            else:
+                self.add(entrystore.get_path(iter), e)
+
+        if parent is None:
+            self.words = sorted(self.postings)
+
+        return self
+
+    def add(self, path, e):
+        "Adds a single entry, stored at path in its entrystore"
+
+        document = len(self.documents)
+        self.documents.append((path, e.name, e.icon))
+
+        text = [e.name, e.description]
+        for field in e.fields:
+            if field.datatype != entry.DATATYPE_PASSWORD:
+                text.append(field.value)
+
+        for word in tokenize(' '.join(filter(None, text))):
+            self.postings.setdefault(word, set()).add(document)
+
+    def search(self, query, limit=None):
+        """
+        Returns (path, name, icon) tuples for the entries matching query,
+        in entrystore order.
+        """
+        matches = None
+
+        for prefix in tokenize(query):
+            documents = set()
+
+            i = bisect.bisect_left(self.words, prefix)
+            while i < len(self.words) and self.words[i].startswith(prefix):
+                documents.update(self.postings[self.words[i]])
+                i += 1
+
+            matches = documents if matches is None else matches & documents
+
+            if not matches:
+                return []
+
+        if matches is None:
+            return []
+
+        if limit is None:
+            documents = sorted(matches)
+        else:
+            documents = heapq.nsmallest(limit, matches)
+
+        return [self.documents[i] for i in documents]
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Secret field values of unlocked files, kept apart from their entries.
+
+The values of password fields are moved into a single bytearray per
+loaded file, the SecretStore, and the fields hold a Secret handle into it
+instead. Wiping a store overwrites all of its values with one slice
+assignment, however many entries the file has. When the bytearray has to
+grow, the values are copied into a larger one and the old one is wiped,
+so no copies are left behind in freed memory. Entries only get their
+secret values back in a copy made right before they are shown.
+
+The strings the values were decrypted into can not be overwritten from
+Python; they are dropped as soon as the values are moved into a store.
+"""
+
+import copy
+import threading
+
+from revelation_indicator.lazy import LazyModule
+
+entry = LazyModule('revelation.entry')
+
+## stores that have not been wiped yet
+_stores = []
+_lock = threading.Lock()
+
+
+class Secret(object):
+    "Handle of a value in a SecretStore"
+
+    __slots__ = ('store', 'offset', 'length', 'generation')
+
+    def __init__(self, store, offset, length, generation):
+        self.store = store
+        self.offset = offset
+        self.length = length
+        self.generation = generation
+
+    def __repr__(self):
+        return '<Secret>'
+
+    ## handles never change, copies of entries can share them
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def reveal(self):
+        "Returns the value, or an empty string once the store was wiped"
+        return self.store.get(self)
+
+
+class SecretStore(object):
+    """
+    The secret values of one loaded file, in a single bytearray. Only the
+    first size bytes of the arena are in use.
+    """
+
+    INITIAL_SIZE = 4096
+
+    def __init__(self):
+        self.arena = bytearray()
+        self.size = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+        with _lock:
+            _stores.append(self)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value):
+        "Moves value into the store, returns its Secret"
+
+        if not isinstance(value, bytes):
+            value = value.encode('utf-8')
+
+        with self.lock:
+            offset = self.size
+
+            if offset + len(value) > len(self.arena):
+                self.__grow(offset + len(value))
+
+            ## the same length, so the bytes are written in place
+            self.arena[offset:offset + len(value)] = value
+            self.size += len(value)
+
+            return Secret(self, offset, len(value), self.generation)
+
+    def get(self, secret):
+        "Returns the value of a Secret of this store"
+
+        with self.lock:
+            if secret.generation != self.generation:
+                return b''
+
+            return memoryview(self.arena)[secret.offset:secret.offset + secret.length].tobytes()
+
+    def wipe(self):
+        "Overwrites all values with zeros and forgets them"
+
+        with self.lock:
+            ## the same length, so the bytes are overwritten in place
+            self.arena[:] = bytearray(len(self.arena))
+            del self.arena[:]
+
+            self.size = 0
+            self.generation += 1
+
+        with _lock:
+            if self in _stores:
+                _stores.remove(self)
+
+    def __grow(self, size):
+        """
+        Moves the values into a new arena of at least size bytes. Resizing
+        the bytearray itself could leave copies in freed memory, so the
+        values are copied without a temporary and the old arena is wiped.
+        """
+        arena = bytearray(max(size, 2 * len(self.arena), self.INITIAL_SIZE))
+        arena[:self.size] = memoryview(self.arena)[:self.size]
+
+        self.arena[:] = bytearray(len(self.arena))
+        self.arena = arena
+
+
+def wipe_all():
+    "Wipes all stores that have not been wiped yet"
+
+    with _lock:
+        stores = list(_stores)
+
+    for store in stores:
+        store.wipe()
+
+
+def protect(entrystore, store, parent=None):
+    """
+    Moves the values of the password fields of all entries below parent
+    into store, in place
+    """
+
+    for i in range(entrystore.iter_n_children(parent)):
+        iter = entrystore.iter_nth_child(parent, i)
+        e = entrystore.get_entry(iter)
+
+        for field in e.fields:
+            if field.datatype == entry.DATATYPE_PASSWORD and field.value and not isinstance(field.value, Secret):
+                field.value = store.add(field.value)
+
+        if entrystore.iter_has_child(iter):
+            protect(entrystore, store, iter)
+
+    return store
+
+
+def plain(value):
+    "Returns value, or the value it is a handle of for a Secret"
+
+    if isinstance(value, Secret):
+        return value.reveal()
+
+    return value
+
+
+def reveal(e):
+    "Returns a copy of e with the values of its secret fields filled in"
+
+    e = copy.copy(e)
+    e.fields = [copy.copy(field) for field in e.fields]
+
+    for field in e.fields:
+        field.value = plain(field.value)
+
+    return e
@@ -0,0 +1,445 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Local service answering lookups from the unlocked files.
+
+Scripts connect to a Unix socket in the user's runtime directory and
+send one JSON request per line, each answered by one JSON line:
+
+    {"method": "search", "query": "mail", "database": 0}
+    {"result": [{"path": [0, 3], "name": "Mail server"}]}
+
+    {"method": "get", "path": [0, 3]}
+    {"result": {"name": "Mail server", "type": "generic", ...}}
+
+Requests are served from the main loop, interleaved with the menu, and
+only while the requested file is unlocked; each one counts as activity
+for its autolock. Only processes of the same user may connect, and each
+of them is limited to RATE requests per second.
+"""
+
+import os
+import json
+import errno
+import socket
+import struct
+
+import gobject
+
+import logging
+logger = logging.getLogger(__file__)
+
+from revelation_indicator import secret, skeleton
+from revelation_indicator.activity import clock
+
+SOCKET_NAME = 'revelation-indicator.sock'
+
+## requests per second and burst allowed for each calling process
+RATE = 20
+BURST = 40
+
+## connections served at a time, longer requests are refused
+MAX_CLIENTS = 16
+MAX_REQUEST = 65536
+
+## search results returned at most
+SEARCH_LIMIT = 50
+
+## Linux socket option returning the pid, uid and gid of the peer
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+
+
+def socket_path():
+    "Returns the file name of the service socket"
+    directory = os.environ.get('XDG_RUNTIME_DIR') or skeleton.cache_dir()
+
+    return os.path.join(directory, SOCKET_NAME)
+
+
+def peer_credentials(sock):
+    "Returns the pid and uid of the process at the other end, or None"
+    try:
+        pid, uid, gid = struct.unpack(
+            '3i', sock.getsockopt(socket.SOL_SOCKET, SO_PEERCRED, struct.calcsize('3i'))
+        )
+
+    except (socket.error, struct.error):
+        return None
+
+    return pid, uid
+
+
+def valid_index(index, count):
+    """
+    Checks that index is an int in range(count), which rules out bools and
+    negative indexes, which would count from the end of a list
+    """
+    return isinstance(index, int) and not isinstance(index, bool) and 0 <= index < count
+
+
+def valid_path(entrystore, path):
+    "Checks that path is a list of indexes leading to an entry in entrystore"
+
+    if not isinstance(path, list) or not path:
+        return False
+
+    iter = None
+
+    for index in path:
+        if not isinstance(index, int) or isinstance(index, bool):
+            return False
+
+        if not 0 <= index < entrystore.iter_n_children(iter):
+            return False
+
+        iter = entrystore.iter_nth_child(iter, index)
+
+    return True
+
+
+def entry_data(e):
+    "Returns what a lookup answers for an entry"
+    return {
+        'name': e.name,
+        'type': e.id,
+        'description': e.description,
+        'notes': e.notes,
+        'updated': e.updated,
+        'fields': dict((field.id, secret.plain(field.value)) for field in e.fields),
+    }
+
+
+class RateLimiter(object):
+    """
+    Token bucket per caller: each one may send burst requests at once and
+    rate requests per second after that.
+    """
+
+    ## callers remembered before full buckets are dropped
+    MAX_CALLERS = 1024
+
+    def __init__(self, rate=RATE, burst=BURST, clock=clock):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+
+        ## tokens left and time of the last update, by caller
+        self.buckets = {}
+
+    def allow(self, key):
+        "Checks if key may send another request now, and counts it"
+        now = self.clock()
+
+        if key not in self.buckets and len(self.buckets) >= self.MAX_CALLERS:
+            self.__prune(now)
+
+        tokens, last = self.buckets.get(key, (self.burst, now))
+
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return False
+
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+    def __prune(self, now):
+        "Drops the buckets that filled up again, they are the same as new"
+
+        for key, (tokens, last) in list(self.buckets.items()):
+            if tokens + (now - last) * self.rate >= self.burst:
+                del self.buckets[key]
+
+
+class Client(object):
+    "A connection to the service"
+
+    def __init__(self, sock, key):
+        self.sock = sock
+        self.key = key
+
+        self.input = b''
+        self.output = b''
+
+        self.watch = None
+        self.write_watch = None
+
+
+class Service(object):
+    "Serves requests of local processes from the files of an indicator"
+
+    def __init__(self, indicator, path=None):
+        self.indicator = indicator
+        self.path = path or socket_path()
+
+        self.sock = None
+        self.watch = None
+        self.clients = []
+        self.limiter = RateLimiter()
+
+    def is_running(self):
+        "Checks if the service is listening"
+        return self.sock is not None
+
+    def start(self):
+        "Starts listening on the socket"
+
+        if self.is_running():
+            return
+
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+        ## a socket left behind by an indicator that did not stop it
+        try:
+            os.unlink(self.path)
+
+        except OSError as error:
+            if error.errno != errno.ENOENT:
+                raise
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+
+        sock.listen(MAX_CLIENTS)
+        sock.setblocking(False)
+
+        self.sock = sock
+        self.watch = gobject.io_add_watch(sock, gobject.IO_IN, self.__cb_accept)
+
+        logger.debug('service listening on %s', self.path)
+
+    def stop(self):
+        "Stops listening and drops all connections"
+
+        if not self.is_running():
+            return
+
+        for client in list(self.clients):
+            self.__close(client)
+
+        gobject.source_remove(self.watch)
+        self.sock.close()
+        self.sock = None
+        self.watch = None
+
+        try:
+            os.unlink(self.path)
+
+        except OSError:
+            pass
+
+    def handle(self, key, request, reply):
+        """
+        Answers a decoded request of the caller key by calling reply with
+        the response, possibly later
+        """
+
+        if not self.limiter.allow(key):
+            return reply({'error': 'rate limited'})
+
+        if not isinstance(request, dict):
+            return reply({'error': 'invalid request'})
+
+        index = request.get('database', 0)
+
+        if not valid_index(index, len(self.indicator.databases)):
+            return reply({'error': 'unknown database'})
+
+        database = self.indicator.databases[index]
+
+        if not database.is_unlocked():
+            return reply({'error': 'locked'})
+
+        database.activity.touch()
+
+        method = request.get('method')
+
+        if method == 'search':
+            query = request.get('query') or ''
+
+            ## the index holds text as Revelation does, UTF-8 encoded
+            if not isinstance(query, str):
+                query = query.encode('utf-8')
+
+            results = database.searchindex.search(query, SEARCH_LIMIT)
+
+            return reply({'result': [
+                {'path': list(path), 'name': name} for path, name, icon in results
+            ]})
+
+        if method == 'get':
+            path = request.get('path')
+
+            if not valid_path(database.entrystore, path):
+                return reply({'error': 'not found'})
+
+            ## the lookup may finish later, from an idle handler, and
+            ## every way it can end has to answer the request once
+            replied = []
+
+            def reply_once(response):
+                if not replied:
+                    replied.append(response)
+                    reply(response)
+
+            def cb_entry(e):
+                try:
+                    ## the file may have been locked while the entry was loaded
+                    if database.is_unlocked():
+                        reply_once({'result': entry_data(e)})
+
+                    else:
+                        reply_once({'error': 'locked'})
+
+                except Exception:
+                    logger.exception('service lookup of %r failed', path)
+                    reply_once({'error': 'not readable'})
+
+            def cb_error(error):
+                reply_once({'error': getattr(error, 'reason', 'not readable')})
+
+            try:
+                database.get_entry(tuple(path), cb_entry, cb_error)
+
+            except Exception:
+                logger.exception('service lookup of %r failed', path)
+                reply_once({'error': 'not readable'})
+
+            return
+
+        reply({'error': 'unknown method'})
+
+    def __cb_accept(self, sock, condition):
+        "Callback for a new connection"
+
+        try:
+            conn, address = sock.accept()
+
+        except socket.error:
+            return True
+
+        credentials = peer_credentials(conn)
+
+        if credentials is not None and credentials[1] != os.getuid():
+            logger.warning('refused service connection of uid %d', credentials[1])
+            conn.close()
+            return True
+
+        if len(self.clients) >= MAX_CLIENTS:
+            logger.debug('too many service connections, refusing one')
+            conn.close()
+            return True
+
+        conn.setblocking(False)
+
+        ## callers are limited by process, without credentials by connection
+        client = Client(conn, credentials is not None and credentials[0] or id(conn))
+        client.watch = gobject.io_add_watch(
+            conn, gobject.IO_IN | gobject.IO_HUP | gobject.IO_ERR, self.__cb_read, client
+        )
+        self.clients.append(client)
+
+        return True
+
+    def __cb_read(self, conn, condition, client):
+        "Callback for data sent by a client"
+
+        try:
+            data = conn.recv(4096)
+
+        except socket.error as error:
+            if error.args[0] in (errno.EAGAIN, errno.EINTR):
+                return True
+
+            data = b''
+
+        if not data:
+            self.__close(client)
+            return False
+
+        client.input += data
+
+        while b'\n' in client.input:
+            line, client.input = client.input.split(b'\n', 1)
+
+            try:
+                request = json.loads(line.decode('utf-8'))
+
+            except ValueError:
+                self.__reply(client, {'error': 'invalid request'})
+                continue
+
+            self.handle(client.key, request, lambda response: self.__reply(client, response))
+
+        if len(client.input) > MAX_REQUEST:
+            self.__reply(client, {'error': 'request too long'})
+            client.input = b''
+
+        return True
+
+    def __reply(self, client, response):
+        "Queues a response for a client, if it is still connected"
+
+        if client not in self.clients:
+            return
+
+        client.output += json.dumps(response).encode('utf-8') + b'\n'
+
+        if client.write_watch is None:
+            client.write_watch = gobject.io_add_watch(
+                client.sock, gobject.IO_OUT, self.__cb_write, client
+            )
+
+    def __cb_write(self, conn, condition, client):
+        "Callback for a client ready to receive queued responses"
+
+        try:
+            sent = conn.send(client.output)
+
+        except socket.error as error:
+            if error.args[0] in (errno.EAGAIN, errno.EINTR):
+                return True
+
+            client.write_watch = None
+            self.__close(client)
+            return False
+
+        client.output = client.output[sent:]
+
+        if client.output:
+            return True
+
+        client.write_watch = None
+        return False
+
+    def __close(self, client):
+        "Drops a connection"
+
+        for watch in (client.watch, client.write_watch):
+            if watch is not None:
+                gobject.source_remove(watch)
+
+        client.sock.close()
+        self.clients.remove(client)
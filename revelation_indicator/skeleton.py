@@ -0,0 +1,222 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+On-disk cache of the menu skeleton of data files.
+
+The skeleton is what a CompactEntryStore keeps of a file: its folder
+structure and the type, name and icon of each entry, nothing secret. It
+is stored encrypted under a key derived from the key of the data file and
+is only used while the modification time, size and digest of the data
+file are the ones it was saved for. This way the menu can be shown as
+soon as the key is known, before the file itself is decrypted.
+"""
+
+import os
+import hmac
+import json
+import zlib
+import hashlib
+
+from revelation_indicator import rvl
+from revelation_indicator.compact import CompactEntry, CompactEntryStore
+from revelation_indicator.lazy import LazyModule
+
+AES = LazyModule('Crypto.Cipher.AES')
+SHA256 = LazyModule('Crypto.Hash.SHA256')
+io = LazyModule('revelation.io')
+
+VERSION = 1
+
+
+def cache_dir():
+    "Returns the directory skeletons are kept in"
+    return os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+        'revelation-indicator'
+    )
+
+
+def cache_file(filename):
+    "Returns the name of the skeleton file of a data file"
+    return os.path.join(
+        cache_dir(),
+        'skeleton-' + hashlib.sha1(filename).hexdigest()
+    )
+
+
+def file_digest(filename):
+    "Returns the digest of a data file, the same as LoadResult.digest"
+    digest = hashlib.sha1()
+
+    input = open(filename, 'rb')
+    try:
+        for block in iter(lambda: input.read(rvl.STREAM_BLOCK_SIZE), ''):
+            digest.update(block)
+
+    finally:
+        input.close()
+
+    return digest.hexdigest()
+
+
+def skeleton_key(key):
+    "Derives the key of a skeleton from the key of its data file"
+    return hmac.new(key, 'revelation-indicator skeleton', hashlib.sha256).digest()
+
+
+def read_meta(filename):
+    "Returns the unencrypted first line of the skeleton of a file, or None"
+    try:
+        input = open(cache_file(filename), 'rb')
+
+    except IOError:
+        return None
+
+    try:
+        meta = json.loads(input.readline())
+        return meta, input.read()
+
+    except ValueError:
+        return None
+
+    finally:
+        input.close()
+
+
+def is_current(meta, stat, digest):
+    "Checks if a skeleton was saved for a file as it is now"
+    return (
+        meta.get('version') == VERSION and
+        stat is not None and
+        [meta.get('mtime'), meta.get('size')] == list(stat) and
+        meta.get('digest') == digest
+    )
+
+
+def load(filename, stat, key):
+    """
+    Returns a CompactEntryStore with the skeleton of filename, or None if
+    there is none, it is outdated or key does not decrypt it. stat is the
+    current file_stat() of the file.
+    """
+    cached = read_meta(filename)
+
+    if cached is None or not is_current(cached[0], stat, file_digest(filename)):
+        return None
+
+    meta, payload = cached
+
+    try:
+        plaintext = AES.new(
+            skeleton_key(key), AES.MODE_CBC, meta['iv'].decode('hex')
+        ).decrypt(payload)
+
+        digest, plaintext = plaintext[:32], plaintext[32:]
+        if SHA256.new(plaintext).digest() != digest:
+            return None
+
+        nodes = json.loads(zlib.decompress(rvl.unpad(plaintext)))
+
+    except (KeyError, TypeError, ValueError, zlib.error, rvl.datahandler.Error):
+        return None
+
+    entrystore = CompactEntryStore()
+
+    for node in nodes:
+        node = CompactEntry(*node)
+
+        ## json decodes all text, Revelation keeps it encoded
+        if not isinstance(node.name, str):
+            node = node._replace(name=node.name.encode('utf-8'))
+
+        if not isinstance(node.icon, str):
+            node = node._replace(icon=node.icon.encode('utf-8'))
+
+        entrystore.add_entry(node, node.parent)
+
+    return entrystore
+
+
+def save(filename, stat, digest, key, entrystore):
+    """
+    Saves the skeleton of the entrystore loaded from filename, unless the
+    saved one is still current.
+    """
+    cached = read_meta(filename)
+
+    if cached is not None and is_current(cached[0], stat, digest):
+        return
+
+    skeleton = CompactEntryStore()
+    skeleton.import_entry(entrystore, None)
+
+    plaintext = zlib.compress(json.dumps([list(node) for node in skeleton.nodes]))
+    plaintext += chr(16 - len(plaintext) % 16) * (16 - len(plaintext) % 16)
+
+    iv = os.urandom(16)
+    meta = {
+        'version': VERSION,
+        'mtime': stat[0],
+        'size': stat[1],
+        'digest': digest,
+        'iv': iv.encode('hex'),
+    }
+
+    payload = AES.new(skeleton_key(key), AES.MODE_CBC, iv).encrypt(
+        SHA256.new(plaintext).digest() + plaintext
+    )
+
+    if not os.path.isdir(cache_dir()):
+        os.makedirs(cache_dir(), 0o700)
+
+    ## written next to the old one and renamed, so readers never see half
+    name = cache_file(filename)
+    output = os.fdopen(os.open(name + '.new', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb')
+
+    try:
+        output.write(json.dumps(meta) + '\n')
+        output.write(payload)
+
+    finally:
+        output.close()
+
+    os.rename(name + '.new', name)
+
+
+def remove(filename=None):
+    """
+    Removes the saved skeleton of filename, or all of them. filename may
+    be given as configured, skeletons are saved under its normalized path.
+    """
+
+    if filename is not None:
+        names = [os.path.basename(cache_file(io.file_normpath(filename)))]
+
+    else:
+        try:
+            names = os.listdir(cache_dir())
+
+        except OSError:
+            return
+
+    for name in names:
+        if name.startswith('skeleton-'):
+            try:
+                os.remove(os.path.join(cache_dir(), name))
+
+            except OSError:
+                pass
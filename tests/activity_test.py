@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import time
+import unittest
+
+from revelation_indicator import activity
+from revelation_indicator.activity import ActivityTracker
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ActivityTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.expired = []
+        self.tracker = ActivityTracker(lambda: self.expired.append(self.clock.now), self.clock)
+
+    def tearDown(self):
+        self.tracker.stop()
+
+    def test_expires_after_timeout_without_activity(self):
+        self.tracker.start(60)
+
+        self.clock.now += 59
+        self.assertTrue(self.tracker.check())
+        self.assertEqual(self.expired, [])
+
+        self.clock.now += 1
+        self.assertFalse(self.tracker.check())
+        self.assertEqual(self.expired, [1060.0])
+
+    def test_activity_postpones_expiry(self):
+        self.tracker.start(60)
+
+        self.clock.now += 50
+        self.tracker.touch()
+
+        self.clock.now += 50
+        self.assertTrue(self.tracker.check())
+
+        self.clock.now += 10
+        self.assertFalse(self.tracker.check())
+        self.assertEqual(len(self.expired), 1)
+
+    def test_expires_only_once(self):
+        self.tracker.start(60)
+
+        self.clock.now += 120
+        self.tracker.check()
+        self.tracker.check()
+
+        self.assertEqual(len(self.expired), 1)
+
+    def test_stopped_tracker_never_expires(self):
+        self.tracker.start(60)
+        self.tracker.stop()
+
+        self.clock.now += 120
+        self.assertFalse(self.tracker.check())
+        self.assertEqual(self.expired, [])
+
+    def test_zero_timeout_does_not_track(self):
+        self.tracker.start(0)
+
+        self.clock.now += 120
+        self.assertFalse(self.tracker.check())
+        self.assertEqual(self.expired, [])
+
+    def test_restart_resets_activity(self):
+        self.tracker.start(60)
+
+        self.clock.now += 50
+        self.tracker.start(60)
+
+        self.clock.now += 50
+        self.assertTrue(self.tracker.check())
+
+
+class ClockTest(unittest.TestCase):
+
+    def test_libc_monotonic_advances(self):
+        monotonic = activity.libc_monotonic()
+
+        if monotonic is None:
+            self.skipTest('clock_gettime is not available')
+
+        before = monotonic()
+        time.sleep(0.01)
+
+        self.assertTrue(monotonic() - before >= 0.005)
+
+    def test_clock_is_monotonic_where_possible(self):
+        if activity.libc_monotonic() is not None:
+            self.assertIsNot(activity.clock, time.time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from revelation_indicator.clipboard import ClipboardChain
+
+
+class FakeSelectionData(object):
+
+    def __init__(self):
+        self.text = None
+
+    def set_text(self, text):
+        self.text = text
+
+
+class FakeClipboard(object):
+    "Calls the clear callback of the previous owner like GTK does"
+
+    def __init__(self):
+        self.owner = None
+
+    def set_with_data(self, targets, get, clear, data):
+        self.clear()
+        self.owner = (get, clear, data)
+
+    def clear(self):
+        if self.owner is not None:
+            get, clear, data = self.owner
+            self.owner = None
+            clear(self, data)
+
+    def paste(self):
+        if self.owner is None:
+            return None
+
+        get, clear, data = self.owner
+        selectiondata = FakeSelectionData()
+        get(self, selectiondata, 0, data)
+
+        return selectiondata.text
+
+
+class ClipboardChainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clipboard = FakeClipboard()
+        self.primary = FakeClipboard()
+        self.chain = ClipboardChain([self.clipboard, self.primary])
+
+    def tearDown(self):
+        self.chain.clear()
+
+    def test_pastes_go_through_the_chain(self):
+        self.chain.set(['octocat', 'hunter2'])
+
+        self.assertEqual(self.clipboard.paste(), 'octocat')
+        self.assertEqual(self.clipboard.paste(), 'hunter2')
+        self.assertEqual(self.clipboard.paste(), 'hunter2')
+
+    def test_selections_go_through_the_chain_separately(self):
+        self.chain.set(['octocat', 'hunter2'])
+
+        self.assertEqual(self.clipboard.paste(), 'octocat')
+        self.assertEqual(self.primary.paste(), 'octocat')
+        self.assertEqual(self.primary.paste(), 'hunter2')
+        self.assertEqual(self.clipboard.paste(), 'hunter2')
+
+    def test_new_values_replace_old_ones(self):
+        self.chain.set(['hunter2'])
+        self.chain.set(['swordfish'])
+
+        self.assertEqual(len(self.chain), 1)
+        self.assertEqual(self.clipboard.paste(), 'swordfish')
+
+    def test_losing_primary_keeps_clipboard(self):
+        self.chain.set(['octocat', 'hunter2'])
+        self.assertEqual(self.clipboard.paste(), 'octocat')
+
+        ## the user selects some text
+        self.primary.set_with_data([], None, lambda clipboard, data: None, None)
+
+        self.assertEqual(len(self.chain), 2)
+        self.assertEqual(self.clipboard.paste(), 'hunter2')
+
+    def test_losing_both_selections_wipes_values(self):
+        self.chain.set(['hunter2'])
+        secrets = self.chain.secrets
+
+        ## another application copies something, the user selects text
+        self.clipboard.clear()
+        self.assertEqual(len(self.chain), 1)
+
+        self.primary.clear()
+
+        self.assertEqual(len(self.chain), 0)
+        self.assertEqual(len(secrets), 0)
+
+    def test_timeout_clears(self):
+        self.chain.set(['hunter2'], timeout=30)
+        self.assertTrue(self.chain.timeout is not None)
+
+        self.chain._ClipboardChain__cb_timeout()
+
+        self.assertEqual(self.chain.timeout, None)
+        self.assertEqual(self.clipboard.paste(), None)
+        self.assertEqual(self.primary.paste(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from revelation import data, entry
+
+from revelation_indicator.compact import CompactEntryStore
+
+
+class TestCompactEntryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.entrystore = data.EntryStore()
+
+        folder = entry.FolderEntry()
+        folder.name = 'Work'
+        parent = self.entrystore.add_entry(folder)
+
+        e = entry.WebEntry()
+        e.name = 'GitHub'
+        e[entry.PasswordField] = 'hunter2'
+        self.entrystore.add_entry(e, parent)
+
+        e = entry.GenericEntry()
+        e.name = 'Mail server'
+        self.entrystore.add_entry(e)
+
+        self.compact = CompactEntryStore()
+        self.compact.import_entry(self.entrystore, None)
+
+    def test_keeps_tree_structure(self):
+        self.assertEqual(len(self.compact), 3)
+        self.assertEqual(self.compact.iter_n_children(None), 2)
+
+        folder = self.compact.iter_nth_child(None, 0)
+        self.assertEqual(self.compact.get_entry(folder).id, entry.FolderEntry.id)
+        self.assertEqual(self.compact.iter_n_children(folder), 1)
+
+    def test_paths_match_the_source_store(self):
+        for path in [(0,), (0, 0), (1,)]:
+            iter = self.compact.get_iter(path)
+            self.assertEqual(self.compact.get_path(iter), path)
+            self.assertEqual(
+                self.compact.get_entry(iter).name,
+                self.entrystore.get_entry(self.entrystore.get_iter(path)).name
+            )
+
+    def test_keeps_no_secrets(self):
+        e = self.compact.get_entry(self.compact.get_iter((0, 0)))
+        self.assertEqual(e.name, 'GitHub')
+        self.assertFalse(hasattr(e, 'fields'))
+        self.assertFalse('hunter2' in [getattr(e, name) for name in e._fields])
+
+    def test_rejects_negative_indexes(self):
+        self.assertRaises(IndexError, self.compact.get_iter, (-1,))
+        self.assertRaises(IndexError, self.compact.get_iter, (0, -1))
+        self.assertRaises(IndexError, self.compact.get_iter, (2,))
+
+    def test_clear_removes_entries(self):
+        self.compact.clear()
+        self.assertEqual(len(self.compact), 0)
+        self.assertEqual(self.compact.iter_n_children(None), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
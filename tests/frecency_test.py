@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from revelation import data, entry
+
+from revelation_indicator import frecency
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FrecencyTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.directory
+
+        self.filename = os.path.join(self.directory, 'passwords.rvl')
+        self.clock = FakeClock()
+        self.tracker = frecency.FrecencyTracker(self.filename, self.clock)
+
+    def tearDown(self):
+        if self.cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache_home
+
+        shutil.rmtree(self.directory)
+
+    def test_ranks_by_frequency(self):
+        mail = self.tracker.record(('Work', 'Mail'))
+        github = self.tracker.record(('Work', 'GitHub'))
+        self.tracker.record(('Work', 'GitHub'))
+
+        self.assertEqual(self.tracker.top(), [github, mail])
+        self.assertEqual(self.tracker.top(1), [github])
+
+    def test_recent_activations_count_more(self):
+        github = self.tracker.record(('GitHub',))
+        self.tracker.record(('GitHub',))
+
+        self.clock.now += 2 * frecency.HALF_LIFE
+        mail = self.tracker.record(('Mail',))
+
+        self.assertEqual(self.tracker.top(), [mail, github])
+        self.assertAlmostEqual(self.tracker.score(github), 0.5)
+
+    def test_keeps_only_the_best(self):
+        for i in range(frecency.KEEP + 5):
+            self.tracker.record(('Entry %d' % i,))
+            self.clock.now += 1
+
+        self.assertEqual(len(self.tracker), frecency.KEEP)
+        self.assertEqual(self.tracker.top(1), [self.tracker.key(('Entry %d' % (frecency.KEEP + 4),))])
+
+    def test_stored_salted_and_hashed(self):
+        github = self.tracker.record(('Work', 'GitHub'))
+
+        stored = open(frecency.frecency_file(self.filename), 'rb').read()
+        self.assertFalse('GitHub' in stored)
+
+        tracker = frecency.FrecencyTracker(self.filename, self.clock)
+        self.assertEqual(tracker.top(), [github])
+
+        other = frecency.FrecencyTracker(self.filename + '.other', self.clock)
+        self.assertNotEqual(other.key(('Work', 'GitHub')), github)
+
+    def test_find_paths(self):
+        entrystore = data.EntryStore()
+
+        folder = entry.FolderEntry()
+        folder.name = 'Work'
+        parent = entrystore.add_entry(folder)
+
+        for name in ('Mail', 'GitHub'):
+            e = entry.WebEntry()
+            e.name = name
+            entrystore.add_entry(e, parent)
+
+        github = self.tracker.record(('Work', 'GitHub'))
+        unknown = self.tracker.record(('Home', 'GitHub'))
+
+        paths = frecency.find_paths(self.tracker, entrystore, set([github, unknown]))
+        self.assertEqual(paths, {github: (0, 1)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from revelation_indicator.rvl import Header, KeyCache
+
+
+class KeyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = KeyCache()
+        self.header = Header(2, 'i' * 16, 36, 's' * 8, 12000)
+
+    def test_get_returns_cached_key(self):
+        self.cache.put('file.rvl', self.header, 'k' * 32)
+
+        self.assertEqual(self.cache.get('file.rvl', self.header), 'k' * 32)
+
+    def test_key_depends_on_salt_and_file(self):
+        self.cache.put('file.rvl', self.header, 'k' * 32)
+
+        resalted = Header(2, 'i' * 16, 36, 't' * 8, 12000)
+        self.assertEqual(self.cache.get('file.rvl', resalted), None)
+        self.assertEqual(self.cache.get('other.rvl', self.header), None)
+
+    def test_clear_zeroes_keys(self):
+        self.cache.put('file.rvl', self.header, 'k' * 32)
+        key = list(self.cache.keys.values())[0]
+
+        self.cache.clear()
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(key, bytearray(32))
+        self.assertEqual(self.cache.get('file.rvl', self.header), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from revelation import entry, util
+
+from revelation_indicator import launcher, secret
+
+
+class FakeConfig(object):
+
+    def __init__(self, values):
+        self.values = values
+        self.monitors = {}
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return self.values.get(key)
+
+    def monitor(self, key, callback, userdata=None):
+        self.monitors[key] = (callback, userdata)
+        callback(key, self.values.get(key), userdata)
+
+    def change(self, key, value):
+        self.values[key] = value
+        callback, userdata = self.monitors[key]
+        callback(key, value, userdata)
+
+
+class CompileTest(unittest.TestCase):
+
+    def test_splits_text_and_substitutions(self):
+        template = launcher.compile('ssh %?u@%h -p 100%%', set('uh'))
+
+        self.assertEqual(template.parts, ['ssh ', ('u', True), '@', ('h', False), ' -p 100%'])
+        self.assertEqual(template.required, frozenset('h'))
+
+    def test_broken_commands(self):
+        for command in ('ssh %', 'ssh %x', 'ssh %?%'):
+            self.assertRaises(util.SubstFormatError, launcher.compile, command, set('uh'))
+
+
+class LauncherCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.username = entry.UsernameField.symbol
+        self.password = entry.PasswordField.symbol
+
+        self.config = FakeConfig({
+            launcher.KEY % entry.WebEntry.id: 'login %%%s %%%s' % (self.username, self.password),
+        })
+        self.launchers = launcher.LauncherCache(self.config)
+
+        self.entry = entry.WebEntry()
+        self.entry[entry.UsernameField] = 'octocat'
+        self.entry[entry.PasswordField] = 'hunter2'
+
+    def test_compiles_each_type_once(self):
+        template = self.launchers.get(entry.WebEntry.id)
+
+        self.assertTrue(self.launchers.get(entry.WebEntry.id) is template)
+        self.assertEqual(self.config.gets, 1)
+
+    def test_types_without_command(self):
+        self.assertEqual(self.launchers.get(entry.GenericEntry.id), None)
+
+    def test_valid_and_expand(self):
+        template = self.launchers.get(entry.WebEntry.id)
+
+        self.assertTrue(template.is_valid(self.entry))
+        self.assertEqual(template.expand(self.entry), 'login octocat hunter2')
+
+        self.entry[entry.UsernameField] = ''
+        self.assertFalse(template.is_valid(self.entry))
+        self.assertRaises(util.SubstValueError, template.expand, self.entry)
+
+    def test_expand_reveals_secrets(self):
+        store = secret.SecretStore()
+        self.entry[entry.PasswordField] = store.add('hunter2')
+
+        template = self.launchers.get(entry.WebEntry.id)
+        self.assertEqual(template.expand(self.entry), 'login octocat hunter2')
+
+        store.wipe()
+
+    def test_change_drops_template(self):
+        old = self.launchers.get(entry.WebEntry.id)
+
+        self.config.change(launcher.KEY % entry.WebEntry.id, 'open %%%s' % self.username)
+        new = self.launchers.get(entry.WebEntry.id)
+
+        self.assertFalse(new is old)
+        self.assertEqual(new.expand(self.entry), 'open octocat')
+
+    def test_broken_command_is_cached(self):
+        self.config.values[launcher.KEY % entry.WebEntry.id] = 'login %'
+
+        self.assertRaises(util.SubstFormatError, self.launchers.get, entry.WebEntry.id)
+        self.assertRaises(util.SubstFormatError, self.launchers.get, entry.WebEntry.id)
+        self.assertEqual(self.config.gets, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,355 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from revelation import data, datahandler, entry
+
+from revelation_indicator import loader, rvl
+
+
+def sample_entrystore():
+    "Returns an entrystore with what Revelation files hold"
+    entrystore = data.EntryStore()
+
+    folder = entry.FolderEntry()
+    folder.name = 'Work & play'
+    folder.description = 'nested <entries>'
+    folder.updated = 1300000000
+    parent = entrystore.add_entry(folder)
+
+    e = entry.WebEntry()
+    e.name = 'GitHub'
+    e.notes = 'two\nlines'
+    e.updated = 1300000001
+    e[entry.UsernameField] = 'octocat'
+    e[entry.PasswordField] = 'hunter2'
+    entrystore.add_entry(e, parent)
+
+    e = entry.GenericEntry()
+    e.name = u'\xdcberweisung'.encode('utf-8')
+    e[entry.PasswordField] = u'p\xe4ss'.encode('utf-8')
+    entrystore.add_entry(e)
+
+    return entrystore
+
+
+def dump(entrystore, parent=None):
+    "Returns the entries below parent as nested lists, to compare entrystores"
+    entries = []
+
+    for i in range(entrystore.iter_n_children(parent)):
+        iter = entrystore.iter_nth_child(parent, i)
+        e = entrystore.get_entry(iter)
+
+        entries.append([
+            e.id, e.name, e.description, e.notes, e.updated,
+            [(field.id, field.value) for field in e.fields],
+            dump(entrystore, iter)
+        ])
+
+    return entries
+
+
+class ProbeFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'passwords.xml')
+        self.data = '<?xml version="1.0" ?>' + ' ' * (rvl.PROBE_SIZE * 4)
+
+        open(self.filename, 'wb').write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_reads_only_the_start(self):
+        probe = loader.probe_file(self.filename)
+
+        self.assertEqual(probe.data, self.data[:rvl.PROBE_SIZE])
+        self.assertEqual(probe.contents, None)
+        self.assertTrue(probe.is_current(self.filename))
+
+    def test_keeps_contents_read_ahead(self):
+        probe = loader.probe_file(self.filename, contents=True)
+
+        self.assertEqual(probe.data, self.data[:rvl.PROBE_SIZE])
+        self.assertEqual(probe.contents, self.data)
+
+    def test_changed_file_is_not_current(self):
+        probe = loader.probe_file(self.filename, contents=True)
+
+        open(self.filename, 'ab').write('more')
+
+        self.assertFalse(probe.is_current(self.filename))
+
+
+class CheckPasswordTest(unittest.TestCase):
+
+    PASSWORD = 'correct horse'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.entrystore = sample_entrystore()
+
+        self.derive_key = rvl.derive_key
+        self.io = loader.io
+        self.derived = []
+
+    def tearDown(self):
+        rvl.derive_key = self.derive_key
+        loader.io = self.io
+
+        shutil.rmtree(self.directory)
+
+    def write(self, handler):
+        filename = os.path.join(self.directory, 'passwords')
+        open(filename, 'wb').write(handler.export_data(self.entrystore, self.PASSWORD))
+
+        return filename
+
+    def wrong_password(self, filename):
+        "Returns a wrong password the probe check catches, nearly any does"
+        probe = loader.probe_file(filename)
+
+        for i in range(10):
+            password = 'wrong %d' % i
+
+            try:
+                rvl.check_key(probe.header, rvl.derive_key(probe.header, password), probe.data)
+
+            except datahandler.PasswordError:
+                return password
+
+    def count_derivations(self):
+        def derive_key(header, password):
+            self.derived.append(password)
+            return self.derive_key(header, password)
+
+        rvl.derive_key = derive_key
+
+    def forbid_reads(self):
+        io = self.io
+
+        class ProbeOnly(object):
+            file_normpath = staticmethod(lambda filename: io.file_normpath(filename))
+
+            def file_read(self, filename):
+                raise AssertionError('%s was read in full' % filename)
+
+        loader.io = ProbeOnly()
+
+    def assert_rejected_by_probe(self, handler):
+        filename = self.write(handler)
+        password = self.wrong_password(filename)
+
+        self.count_derivations()
+        self.forbid_reads()
+
+        self.assertRaises(datahandler.PasswordError, loader.load_file, filename, password)
+        self.assertEqual(self.derived, [password])
+
+    def test_wrong_password_of_version_1_is_rejected_by_probe(self):
+        self.assert_rejected_by_probe(datahandler.Revelation())
+
+    def test_wrong_password_of_version_2_is_rejected_by_probe(self):
+        self.assert_rejected_by_probe(datahandler.Revelation2())
+
+    def test_correct_password_derives_the_key_once(self):
+        filename = self.write(datahandler.Revelation2())
+        self.count_derivations()
+
+        result = loader.load_file(filename, self.PASSWORD)
+
+        self.assertEqual(dump(result.entrystore), dump(self.entrystore))
+        self.assertEqual(self.derived, [self.PASSWORD])
+
+
+class ImportDataTest(unittest.TestCase):
+    "The staged decoding has to give what the data handlers give"
+
+    PASSWORD = 'correct horse'
+
+    def setUp(self):
+        self.entrystore = sample_entrystore()
+
+    def assert_round_trip(self, handler):
+        data = handler.export_data(self.entrystore, self.PASSWORD)
+
+        imported = loader.import_data(handler, data, self.PASSWORD)
+
+        self.assertEqual(dump(imported), dump(handler.import_data(data, self.PASSWORD)))
+        self.assertEqual(dump(imported), dump(self.entrystore))
+
+    def test_version_1_round_trip(self):
+        self.assert_round_trip(datahandler.Revelation())
+
+    def test_version_2_round_trip(self):
+        self.assert_round_trip(datahandler.Revelation2())
+
+    def test_wrong_password_raises(self):
+        for handler in [datahandler.Revelation(), datahandler.Revelation2()]:
+            data = handler.export_data(self.entrystore, self.PASSWORD)
+
+            self.assertRaises(
+                datahandler.PasswordError,
+                loader.import_data, handler, data, 'wrong'
+            )
+
+
+class StreamTest(unittest.TestCase):
+    "Streamed loading has to give what the data handlers give"
+
+    PASSWORD = 'correct horse'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'passwords')
+        self.entrystore = sample_entrystore()
+
+        ## enough entries for a payload of many blocks
+        for i in range(200):
+            e = entry.GenericEntry()
+            e.name = 'Server %d' % i
+            e[entry.PasswordField] = 'secret %d' % i
+            self.entrystore.add_entry(e)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, handler):
+        data = handler.export_data(self.entrystore, self.PASSWORD)
+        open(self.filename, 'wb').write(data)
+
+        return data
+
+    def blocksizes(self, header, data):
+        "Returns block sizes that divide the payload and ones that do not"
+        size = len(data) - header.offset
+        blocks = size // 16
+
+        dividing = [16 * n for n in range(3, blocks + 1) if blocks % n == 0]
+        other = [16 * n for n in range(3, blocks) if blocks % n != 0]
+
+        self.assertTrue(dividing and other)
+
+        return dividing[:3] + other[:3] + [size + 16, rvl.STREAM_BLOCK_SIZE]
+
+    def assert_streams(self, handler):
+        data = self.write(handler)
+        header = rvl.parse_header(data)
+        key = rvl.derive_key(header, self.PASSWORD)
+
+        expected = dump(handler.import_data(data, self.PASSWORD))
+        self.assertEqual(expected, dump(self.entrystore))
+
+        for blocksize in self.blocksizes(header, data):
+            entrystore = rvl.parse_stream(rvl.decrypt_stream(header, key, data, blocksize))
+            self.assertEqual(dump(entrystore), expected, 'block size %d' % blocksize)
+
+        ## from an mmap of the file, and from a file read ahead
+        for contents in [False, True]:
+            probe = loader.probe_file(self.filename, contents)
+            result = loader.stream_file(probe, loader.check_password(probe, self.PASSWORD))
+
+            self.assertEqual(dump(result.entrystore), expected)
+
+        result = loader.load_file(self.filename, self.PASSWORD, stream=True)
+        self.assertEqual(dump(result.entrystore), expected)
+
+    def test_version_1(self):
+        self.assert_streams(datahandler.Revelation())
+
+    def test_version_2(self):
+        self.assert_streams(datahandler.Revelation2())
+
+    def test_corrupted_file_raises(self):
+        data = self.write(datahandler.Revelation2())
+        probe = loader.probe_file(self.filename)
+        key = loader.check_password(probe, self.PASSWORD)
+
+        open(self.filename, 'wb').write(data[:-1] + chr(ord(data[-1]) ^ 1))
+
+        self.assertRaises(datahandler.PasswordError, loader.stream_file, loader.probe_file(self.filename), key)
+
+
+class ReloadSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'passwords')
+        open(self.filename, 'wb').write('rvl\x00')
+
+        self.timeouts = []
+        self.timeout_add = loader.gobject.timeout_add
+        loader.gobject.timeout_add = lambda delay, callback: self.timeouts.append((delay, callback))
+
+        self.reloads = []
+        self.busy = False
+        self.scheduler = loader.ReloadScheduler(self.reload)
+        self.scheduler.loaded(loader.LoadResult(
+            self.filename, None, None, loader.file_stat(self.filename), 'digest'
+        ))
+
+    def tearDown(self):
+        loader.gobject.timeout_add = self.timeout_add
+        shutil.rmtree(self.directory)
+
+    def reload(self):
+        self.reloads.append(True)
+        return not self.busy
+
+    def fire(self):
+        delay, callback = self.timeouts.pop(0)
+        callback()
+
+        return delay
+
+    def change(self):
+        stat = os.stat(self.filename)
+        os.utime(self.filename, (stat.st_atime, stat.st_mtime + 10))
+
+    def test_busy_worker_is_retried_after_a_while(self):
+        self.change()
+        self.busy = True
+
+        self.scheduler.schedule(0)
+        self.assertEqual(self.fire(), 0)
+
+        self.assertEqual(len(self.reloads), 1)
+        self.assertEqual(self.fire(), loader.RELOAD_RETRY)
+        self.assertEqual(len(self.reloads), 2)
+
+    def test_unchanged_contents_update_the_stat(self):
+        self.change()
+
+        self.scheduler.schedule(0)
+        self.fire()
+        self.assertEqual(len(self.reloads), 1)
+
+        self.scheduler.finished(stat=loader.file_stat(self.filename))
+
+        ## a notification without a change is skipped now
+        self.scheduler.schedule(0)
+        self.fire()
+        self.assertEqual(len(self.reloads), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
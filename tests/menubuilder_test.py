@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from revelation_indicator.menubuilder import MenuBuilder
+
+
+class FakeMenu(object):
+
+    def __init__(self):
+        self.items = []
+
+    def append(self, item):
+        self.items.append(item)
+
+
+class MenuBuilderTest(unittest.TestCase):
+
+    def test_small_menus_are_built_right_away(self):
+        menu = FakeMenu()
+        builder = MenuBuilder(menu, 10, lambda i: i)
+
+        self.assertTrue(builder.is_done())
+        self.assertEqual(builder.source, None)
+        self.assertEqual(menu.items, list(range(10)))
+
+    def test_large_menus_are_built_in_chunks(self):
+        menu = FakeMenu()
+        builder = MenuBuilder(menu, MenuBuilder.CHUNK_SIZE * 2 + 1, lambda i: i)
+
+        self.assertFalse(builder.is_done())
+        self.assertEqual(len(menu.items), MenuBuilder.CHUNK_SIZE)
+
+        builder.finish()
+
+        self.assertTrue(builder.is_done())
+        self.assertEqual(builder.source, None)
+        self.assertEqual(menu.items, list(range(MenuBuilder.CHUNK_SIZE * 2 + 1)))
+
+    def test_cancel_stops_building(self):
+        menu = FakeMenu()
+        builder = MenuBuilder(menu, MenuBuilder.CHUNK_SIZE + 1, lambda i: i)
+        builder.cancel()
+
+        self.assertFalse(builder.is_done())
+        self.assertEqual(builder.source, None)
+        self.assertEqual(len(menu.items), MenuBuilder.CHUNK_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
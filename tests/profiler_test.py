@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from revelation_indicator import profiler
+
+
+def check_password(password):
+    "Stands in for code that handles a secret"
+    return sorted(password) == sorted(password[::-1])
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.directory
+
+    def tearDown(self):
+        profiler.armed = False
+        profiler.finish(profiler._session)
+
+        if self.cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache_home
+
+        shutil.rmtree(self.directory)
+
+    def test_does_nothing_unless_armed(self):
+        self.assertEqual(profiler.start('file_open'), None)
+        self.assertTrue(profiler.profile_thread(None) is profiler.NOPROFILE)
+        self.assertEqual(profiler.finish(None), None)
+
+    def test_profiles_only_the_next_load(self):
+        profiler.arm()
+
+        token = profiler.start('file_open')
+        self.assertTrue(token is not None)
+        self.assertEqual(profiler.start('file_load'), None)
+        self.assertTrue(profiler.finish(token) is not None)
+
+        self.assertEqual(profiler.start('file_open'), None)
+
+    def test_other_loads_do_not_finish_the_session(self):
+        profiler.arm()
+        token = profiler.start('file_open')
+
+        ## a background reload or a load of another file
+        self.assertTrue(profiler.profile_thread(None) is profiler.NOPROFILE)
+        self.assertEqual(profiler.finish(None), None)
+        self.assertTrue(profiler.is_running())
+
+        self.assertTrue(profiler.finish(token) is not None)
+        self.assertFalse(profiler.is_running())
+
+    def test_report_of_main_loop_and_worker(self):
+        password = 'hunter2' + str(os.getpid())
+
+        profiler.arm()
+        token = profiler.start('file_open')
+
+        def worker():
+            with profiler.profile_thread(token):
+                check_password(password)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        filename = profiler.finish(token)
+        report = open(filename).read()
+
+        self.assertTrue(os.path.basename(filename).startswith('profile-file_open-'))
+        self.assertEqual(os.stat(filename).st_mode & 0o777, 0o600)
+        self.assertTrue('check_password' in report)
+        self.assertFalse(password in report)
+
+    def test_finish_waits_for_worker(self):
+        profiler.arm()
+        token = profiler.start('file_content_changed')
+        entered = threading.Event()
+        proceed = threading.Event()
+
+        def worker():
+            with profiler.profile_thread(token):
+                ## the worker hands back its result before it is done
+                entered.set()
+                proceed.wait()
+                check_password('swordfish')
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        entered.wait()
+
+        timer = threading.Timer(0.1, proceed.set)
+        timer.start()
+
+        filename = profiler.finish(token)
+        thread.join()
+
+        self.assertTrue('check_password' in open(filename).read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import zlib
+import unittest
+
+from Crypto.Cipher import AES
+from revelation import data, datahandler, entry
+
+from revelation_indicator import rvl
+
+
+def encrypt_v1(key, plaintext):
+    "Encrypts plaintext the way data version 1 files are"
+    iv = 'i' * 16
+
+    data = zlib.compress(plaintext)
+    padlen = 16 - len(data) % 16
+    data += chr(padlen) * padlen
+
+    return (
+        rvl.MAGIC + '\x01' + '\x00' * 7 +
+        AES.new(key, AES.MODE_ECB).encrypt(iv) +
+        AES.new(key, AES.MODE_CBC, iv).encrypt(data)
+    )
+
+
+class CheckKeyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.key = rvl.derive_key(rvl.Header(1, None, 28), 'password')
+        self.data = encrypt_v1(self.key, '<revelationdata/>' * 10)
+        self.header = rvl.parse_header(self.data)
+
+    def test_correct_key_passes(self):
+        rvl.check_key(self.header, self.key, self.data[:rvl.PROBE_SIZE])
+
+    def test_wrong_key_raises(self):
+        key = rvl.derive_key(self.header, 'wrong')
+
+        self.assertRaises(
+            datahandler.PasswordError,
+            rvl.check_key, self.header, key, self.data[:rvl.PROBE_SIZE]
+        )
+
+    def test_short_data_is_not_checked(self):
+        key = rvl.derive_key(self.header, 'wrong')
+
+        rvl.check_key(self.header, key, self.data[:self.header.offset])
+
+
+class DecryptStreamTest(unittest.TestCase):
+
+    PASSWORD = 'correct horse'
+
+    def export(self, handler):
+        entrystore = data.EntryStore()
+
+        for i in range(50):
+            e = entry.GenericEntry()
+            e.name = 'Server %d' % i
+            e[entry.PasswordField] = 'secret %d' % i
+            entrystore.add_entry(e)
+
+        contents = handler.export_data(entrystore, self.PASSWORD)
+        header = rvl.parse_header(contents)
+
+        return header, rvl.derive_key(header, self.PASSWORD), contents
+
+    def decrypt(self, header, key, data, blocksize=64):
+        return ''.join(rvl.decrypt_stream(header, key, data, blocksize))
+
+    def corrupt(self, data, offset):
+        return data[:offset] + chr(ord(data[offset]) ^ 0x55) + data[offset + 1:]
+
+    def test_matches_decrypt(self):
+        for handler in [datahandler.Revelation(), datahandler.Revelation2()]:
+            header, key, data = self.export(handler)
+
+            self.assertEqual(self.decrypt(header, key, data), rvl.decrypt(header, key, data))
+
+    def test_corrupted_last_block_raises(self):
+        for handler in [datahandler.Revelation(), datahandler.Revelation2()]:
+            header, key, data = self.export(handler)
+
+            for offset in range(len(data) - 16, len(data)):
+                self.assertRaises(
+                    datahandler.PasswordError,
+                    self.decrypt, header, key, self.corrupt(data, offset)
+                )
+
+    def test_bad_digest_raises_after_document(self):
+        header, key, data = self.export(datahandler.Revelation2())
+
+        ## flips a bit of the digest, the document itself stays intact
+        data = self.corrupt(data, header.offset)
+        chunks = rvl.decrypt_stream(header, key, data, 64)
+
+        document = ''
+        try:
+            for chunk in chunks:
+                document += chunk
+
+        except datahandler.PasswordError:
+            pass
+
+        else:
+            self.fail('PasswordError not raised')
+
+        self.assertTrue(document.endswith('</revelationdata>\n'))
+
+    def test_truncated_payload_raises(self):
+        for handler in [datahandler.Revelation(), datahandler.Revelation2()]:
+            header, key, data = self.export(handler)
+
+            self.assertRaises(
+                (datahandler.PasswordError, datahandler.FormatError),
+                self.decrypt, header, key, data[:-16]
+            )
+
+
+class StreamParserTest(unittest.TestCase):
+
+    DOCUMENT = (
+        '<?xml version="1.0" encoding="utf-8" ?>'
+        '<revelationdata version="0.4.14" dataversion="1">'
+        '<entry type="folder"><name>Folder</name><updated>1</updated>'
+        '<entry type="website"><name>Site &amp; co</name>'
+        '<field id="generic-username">user</field></entry>'
+        '</entry>'
+        '</revelationdata>'
+    )
+
+    def parse(self, document, size=7):
+        return rvl.parse_stream(
+            document[i:i + size] for i in range(0, len(document), size)
+        )
+
+    def test_builds_entrystore_from_pieces(self):
+        entrystore = self.parse(self.DOCUMENT)
+
+        folder = entrystore.iter_nth_child(None, 0)
+        self.assertEqual(entrystore.get_entry(folder).name, 'Folder')
+        self.assertEqual(entrystore.get_entry(folder).updated, 1)
+
+        e = entrystore.get_entry(entrystore.iter_nth_child(folder, 0))
+        self.assertEqual(type(e), entry.WebEntry)
+        self.assertEqual(e.name, 'Site & co')
+        self.assertEqual(e[entry.UsernameField], 'user')
+
+    def test_unknown_root_raises(self):
+        self.assertRaises(datahandler.FormatError, self.parse, '<data/>')
+
+    def test_truncated_document_raises(self):
+        self.assertRaises(
+            datahandler.FormatError, self.parse, self.DOCUMENT[:-20]
+        )
+
+    def test_entry_in_entry_raises(self):
+        self.assertRaises(datahandler.DataError, self.parse, (
+            '<revelationdata dataversion="1">'
+            '<entry type="website"><entry type="website"/></entry>'
+            '</revelationdata>'
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
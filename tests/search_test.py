@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from revelation import data, entry
+
+from revelation_indicator.search import SearchIndex
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.entrystore = data.EntryStore()
+
+        folder = entry.FolderEntry()
+        folder.name = 'Work'
+        parent = self.entrystore.add_entry(folder)
+
+        e = entry.WebEntry()
+        e.name = 'GitHub'
+        e.description = 'code hosting'
+        e[entry.UsernameField] = 'octocat'
+        e[entry.PasswordField] = 'hunter2'
+        self.entrystore.add_entry(e, parent)
+
+        e = entry.GenericEntry()
+        e.name = 'Mail server'
+        self.entrystore.add_entry(e)
+
+        self.index = SearchIndex().build(self.entrystore)
+
+    def test_finds_entries_by_word_prefix(self):
+        results = self.index.search('git')
+        self.assertEqual([name for path, name, icon in results], ['GitHub'])
+        self.assertEqual(results[0][0], (0, 0))
+
+    def test_all_query_words_have_to_match(self):
+        self.assertEqual(len(self.index.search('code host')), 1)
+        self.assertEqual(len(self.index.search('code mail')), 0)
+
+    def test_searches_non_secret_fields(self):
+        self.assertEqual(len(self.index.search('octo')), 1)
+
+    def test_does_not_index_passwords(self):
+        self.assertEqual(self.index.search('hunter2'), [])
+
+    def test_finds_non_ascii_words_in_any_case(self):
+        e = entry.GenericEntry()
+        e.name = u'\xdcberweisung Bank'.encode('utf-8')
+        self.entrystore.add_entry(e)
+        self.index = SearchIndex().build(self.entrystore)
+
+        results = self.index.search(u'\xdcBER'.encode('utf-8'))
+        self.assertEqual([name for path, name, icon in results], [e.name])
+        self.assertEqual(len(self.index.search(u'\xfcberw')), 1)
+
+    def test_update_takes_contents_of_other_index(self):
+        e = entry.GenericEntry()
+        e.name = 'Router'
+        self.entrystore.add_entry(e)
+
+        self.index.update(SearchIndex().build(self.entrystore))
+        self.assertEqual(len(self.index.search('router')), 1)
+        self.assertEqual(len(self.index.search('git')), 1)
+
+    def test_clear_empties_index(self):
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.search('git'), [])
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import gc
+import copy
+import binascii
+import unittest
+
+from revelation import data, entry
+
+from revelation_indicator import secret
+
+
+class SecretStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = secret.SecretStore()
+
+    def tearDown(self):
+        self.store.wipe()
+
+    def test_reveal_returns_value(self):
+        first = self.store.add('hunter2')
+        second = self.store.add('correct horse')
+
+        self.assertEqual(first.reveal(), 'hunter2')
+        self.assertEqual(second.reveal(), 'correct horse')
+        self.assertEqual(repr(first), '<Secret>')
+
+    def test_wipe_zeroes_values(self):
+        handle = self.store.add('hunter2')
+        arena = self.store.arena
+
+        self.store.wipe()
+
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(handle.reveal(), '')
+        self.assertTrue('hunter2' not in bytes(arena))
+
+    def test_growing_wipes_old_arena(self):
+        first = self.store.add('hunter2')
+        arena = self.store.arena
+
+        second = self.store.add('x' * len(arena))
+
+        self.assertTrue(self.store.arena is not arena)
+        self.assertEqual(bytes(arena), b'\0' * len(arena))
+        self.assertEqual(first.reveal(), 'hunter2')
+        self.assertEqual(second.reveal(), 'x' * len(arena))
+        self.assertEqual(len(self.store), len(arena) + 7)
+
+    def test_wipe_all_wipes_registered_stores(self):
+        other = secret.SecretStore()
+        handles = [self.store.add('hunter2'), other.add('swordfish')]
+
+        secret.wipe_all()
+
+        self.assertEqual([handle.reveal() for handle in handles], ['', ''])
+        self.assertTrue(other not in secret._stores)
+
+    def test_copies_share_the_handle(self):
+        handle = self.store.add('hunter2')
+
+        self.assertTrue(copy.copy(handle) is handle)
+        self.assertTrue(copy.deepcopy(handle) is handle)
+
+
+class ProtectTest(unittest.TestCase):
+
+    def setUp(self):
+        ## not a constant of the test code, which would keep it reachable
+        self.password = binascii.hexlify(os.urandom(8))
+        self.entrystore = data.EntryStore()
+
+        folder = entry.FolderEntry()
+        folder.name = 'Work'
+        parent = self.entrystore.add_entry(folder)
+
+        e = entry.WebEntry()
+        e.name = 'GitHub'
+        e[entry.UsernameField] = 'octocat'
+        e[entry.PasswordField] = self.password
+        self.iter = self.entrystore.add_entry(e, parent)
+
+        self.store = secret.protect(self.entrystore, secret.SecretStore())
+
+    def tearDown(self):
+        self.store.wipe()
+
+    def test_moves_passwords_into_store(self):
+        e = self.entrystore.get_entry(self.iter)
+
+        self.assertTrue(isinstance(e[entry.PasswordField], secret.Secret))
+        self.assertEqual(e[entry.UsernameField], 'octocat')
+        self.assertEqual(bytes(self.store.arena[:len(self.store)]), self.password)
+
+    def test_reveal_fills_in_a_copy(self):
+        e = self.entrystore.get_entry(self.iter)
+        revealed = secret.reveal(e)
+
+        self.assertEqual(revealed[entry.PasswordField], self.password)
+        self.assertTrue(isinstance(e[entry.PasswordField], secret.Secret))
+
+    def test_no_plaintext_reachable_after_wipe(self):
+        self.store.wipe()
+
+        e = self.entrystore.get_entry(self.iter)
+        self.assertEqual(secret.reveal(e)[entry.PasswordField], '')
+
+        password = self.password
+        del self.password
+
+        gc.collect()
+        for obj in gc.get_objects():
+            if isinstance(obj, (dict, list, bytearray)):
+                self.assertFalse(password in gc.get_referents(obj))
+
+            if isinstance(obj, bytearray):
+                self.assertFalse(password in bytes(obj))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from revelation_indicator.service import RateLimiter, Service
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeActivity(object):
+
+    def __init__(self):
+        self.touched = 0
+
+    def touch(self):
+        self.touched += 1
+
+
+class FakeSearchIndex(object):
+
+    def search(self, query, limit=None):
+        if query == 'git':
+            return [((0, 1), 'GitHub', 'icon')]
+
+        return []
+
+
+class FakeField(object):
+
+    def __init__(self, id, value):
+        self.id = id
+        self.value = value
+
+
+class FakeEntry(object):
+    id = 'website'
+    name = 'GitHub'
+    description = 'code hosting'
+    notes = ''
+    updated = 0
+
+    def __init__(self):
+        self.fields = [FakeField('generic-password', 'hunter2')]
+
+
+class FakeEntryError(Exception):
+
+    def __init__(self, reason):
+        Exception.__init__(self, reason)
+        self.reason = reason
+
+
+class FakeEntryStore(object):
+    "A folder holding two entries, iters are paths"
+
+    children = {None: 1, (0,): 2}
+
+    def iter_n_children(self, iter):
+        return self.children.get(iter, 0)
+
+    def iter_nth_child(self, iter, n):
+        return (iter or ()) + (n,)
+
+
+class FakeDatabase(object):
+
+    def __init__(self):
+        self.unlocked = True
+        self.activity = FakeActivity()
+        self.searchindex = FakeSearchIndex()
+        self.entrystore = FakeEntryStore()
+        self.error = None
+
+    def is_unlocked(self):
+        return self.unlocked
+
+    def get_entry(self, path, callback, errback=None):
+        if self.error is not None:
+            return errback(self.error)
+
+        if path != (0, 1):
+            return errback(FakeEntryError('not found'))
+
+        callback(FakeEntry())
+
+
+class FakeIndicator(object):
+
+    def __init__(self):
+        self.databases = [FakeDatabase()]
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(rate=2, burst=3, clock=self.clock)
+
+    def test_allows_burst_then_rate(self):
+        self.assertEqual([self.limiter.allow('a') for i in range(4)], [True, True, True, False])
+
+        self.clock.now += 0.5
+        self.assertEqual([self.limiter.allow('a') for i in range(2)], [True, False])
+
+    def test_callers_are_limited_separately(self):
+        for i in range(3):
+            self.limiter.allow('a')
+
+        self.assertFalse(self.limiter.allow('a'))
+        self.assertTrue(self.limiter.allow('b'))
+
+    def test_prunes_full_buckets(self):
+        self.limiter.MAX_CALLERS = 2
+        self.limiter.allow('a')
+        self.limiter.allow('b')
+
+        self.clock.now += 10
+        self.limiter.allow('c')
+
+        self.assertEqual(sorted(self.limiter.buckets), ['c'])
+
+
+class ServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indicator = FakeIndicator()
+        self.database = self.indicator.databases[0]
+        self.service = Service(self.indicator, '/nonexistent/service.sock')
+        self.responses = []
+
+    def request(self, request, key='caller'):
+        self.service.handle(key, request, self.responses.append)
+        return self.responses.pop()
+
+    def test_search(self):
+        self.assertEqual(
+            self.request({'method': 'search', 'query': u'git'}),
+            {'result': [{'path': [0, 1], 'name': 'GitHub'}]}
+        )
+        self.assertEqual(self.database.activity.touched, 1)
+
+    def test_get(self):
+        response = self.request({'method': 'get', 'path': [0, 1]})
+
+        self.assertEqual(response['result']['name'], 'GitHub')
+        self.assertEqual(response['result']['fields'], {'generic-password': 'hunter2'})
+
+    def test_errors(self):
+        self.assertEqual(self.request({'method': 'get', 'path': [5]}), {'error': 'not found'})
+        self.assertEqual(self.request({'method': 'get'}), {'error': 'not found'})
+        self.assertEqual(self.request({'method': 'drop'}), {'error': 'unknown method'})
+        self.assertEqual(self.request({'method': 'get', 'database': 3}), {'error': 'unknown database'})
+
+    def test_database_must_be_a_plain_index(self):
+        for index in (-1, True, False, '0', 0.0, None, [0]):
+            self.assertEqual(
+                self.request({'method': 'get', 'path': [0, 1], 'database': index}),
+                {'error': 'unknown database'}
+            )
+        self.assertEqual(self.request([]), {'error': 'invalid request'})
+
+    def test_get_rejects_bad_paths(self):
+        for path in [[], [-1], [0, -1], [0, 2], [1], [0, 1, 0], [0, 1.0], [0, '1'], [False, 1], '01', None]:
+            self.assertEqual(
+                self.request({'method': 'get', 'path': path}),
+                {'error': 'not found'}
+            )
+
+    def test_get_answers_lookup_errors(self):
+        self.database.error = FakeEntryError('changed')
+        self.assertEqual(self.request({'method': 'get', 'path': [0, 1]}), {'error': 'changed'})
+
+        self.database.error = IOError()
+        self.assertEqual(self.request({'method': 'get', 'path': [0, 1]}), {'error': 'not readable'})
+
+    def test_get_answers_failing_lookups_once(self):
+        def get_entry(path, callback, errback=None):
+            callback(None)
+            raise RuntimeError
+
+        self.database.get_entry = get_entry
+
+        self.assertEqual(self.request({'method': 'get', 'path': [0, 1]}), {'error': 'not readable'})
+        self.assertEqual(self.responses, [])
+
+    def test_answers_only_while_unlocked(self):
+        self.database.unlocked = False
+
+        self.assertEqual(self.request({'method': 'search', 'query': 'git'}), {'error': 'locked'})
+        self.assertEqual(self.database.activity.touched, 0)
+
+    def test_rate_limited(self):
+        for i in range(self.service.limiter.burst):
+            self.request({'method': 'search', 'query': 'git'})
+
+        self.assertEqual(self.request({'method': 'search', 'query': 'git'}), {'error': 'rate limited'})
+        self.assertTrue('result' in self.request({'method': 'search', 'query': 'git'}, 'other'))
+
+
+if __name__ == '__main__':
+    unittest.main()
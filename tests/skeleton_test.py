@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from revelation import data, entry
+
+from revelation_indicator import skeleton
+
+
+class SkeletonTest(unittest.TestCase):
+
+    KEY = 'k' * 32
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.directory
+
+        self.filename = os.path.join(self.directory, 'passwords.rvl')
+        open(self.filename, 'wb').write('rvl\x00 not really encrypted')
+        self.stat = (os.stat(self.filename).st_mtime, os.stat(self.filename).st_size)
+        self.digest = skeleton.file_digest(self.filename)
+
+        self.entrystore = data.EntryStore()
+
+        folder = entry.FolderEntry()
+        folder.name = 'Work'
+        parent = self.entrystore.add_entry(folder)
+
+        e = entry.WebEntry()
+        e.name = 'GitHub'
+        e[entry.PasswordField] = 'hunter2'
+        self.entrystore.add_entry(e, parent)
+
+    def tearDown(self):
+        if self.cache_home is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache_home
+
+        shutil.rmtree(self.directory)
+
+    def save(self):
+        skeleton.save(self.filename, self.stat, self.digest, self.KEY, self.entrystore)
+
+    def test_load_returns_saved_skeleton(self):
+        self.save()
+        compact = skeleton.load(self.filename, self.stat, self.KEY)
+
+        self.assertEqual(compact.iter_n_children(None), 1)
+        self.assertEqual(compact.get_entry(compact.get_iter((0,))).name, 'Work')
+        self.assertEqual(compact.get_entry(compact.get_iter((0, 0))).name, 'GitHub')
+
+    def test_saved_skeleton_is_encrypted(self):
+        self.save()
+        saved = open(skeleton.cache_file(self.filename), 'rb').read()
+
+        self.assertFalse('GitHub' in saved)
+        self.assertFalse('hunter2' in saved)
+
+    def test_wrong_key_loads_nothing(self):
+        self.save()
+        self.assertEqual(skeleton.load(self.filename, self.stat, 'x' * 32), None)
+
+    def test_changed_file_loads_nothing(self):
+        self.save()
+        open(self.filename, 'ab').write('more')
+
+        self.assertEqual(skeleton.load(self.filename, self.stat, self.KEY), None)
+
+    def test_remove_deletes_skeletons(self):
+        self.save()
+        skeleton.remove()
+
+        self.assertFalse(os.path.exists(skeleton.cache_file(self.filename)))
+        self.assertEqual(skeleton.load(self.filename, self.stat, self.KEY), None)
+
+    def test_remove_normalizes_the_file_name(self):
+        home = os.environ.get('HOME')
+        os.environ['HOME'] = self.directory
+
+        try:
+            for filename in ['~/passwords.rvl', os.path.join(self.directory, 'sub', '..', 'passwords.rvl')]:
+                self.save()
+                skeleton.remove(filename)
+
+                self.assertFalse(os.path.exists(skeleton.cache_file(self.filename)))
+
+        finally:
+            if home is None:
+                del os.environ['HOME']
+            else:
+                os.environ['HOME'] = home
+
+    def test_remove_keeps_other_skeletons(self):
+        self.save()
+        skeleton.remove(os.path.join(self.directory, 'other.rvl'))
+
+        self.assertTrue(os.path.exists(skeleton.cache_file(self.filename)))
+
+
+if __name__ == '__main__':
+    unittest.main()